@@ -1,7 +1,9 @@
 from .logger import logger
 from .settings import app_settings
+from .tracing import tracer
 
 __ALL__ = [
     "logger",
     "app_settings",
+    "tracer",
 ]
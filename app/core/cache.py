@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from . import codec
+
+SHARED_CACHE = os.getenv("SHARED_CACHE", "false").lower() == "true"
+
+
+class LocalCache:
+    """In-process LRU cache with per-entry TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SharedCache:
+    """Cache shared by every worker on the host through a SQLite file.
+
+    Values must be JSON serializable. Expired rows are purged lazily once the
+    namespace grows past `maxsize`.
+    """
+
+    def __init__(self, path: Path, namespace: str, maxsize: int = 1024, ttl: float = 300.0):
+        self.path = Path(path)
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT, key TEXT, value TEXT, expires REAL, "
+                "PRIMARY KEY (namespace, key))")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute(
+            "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key)).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return codec.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, codec.dumps(value), expires))
+        if len(self) > self.maxsize:
+            self._evict(conn)
+
+    def delete(self, key: str) -> None:
+        self._conn().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM cache WHERE namespace = ? AND expires < ?",
+                     (self.namespace, time.time()))
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache WHERE namespace = ? ORDER BY expires ASC "
+            "LIMIT max(0, (SELECT count(*) FROM cache WHERE namespace = ?) - ?))",
+            (self.namespace, self.namespace, self.namespace, self.maxsize))
+
+    def __len__(self) -> int:
+        return self._conn().execute(
+            "SELECT count(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+
+_caches: Dict[str, Any] = {}
+
+
+def get_cache(namespace: str, maxsize: int = 1024, ttl: float = 300.0):
+    """Return the cache for `namespace`, shared across workers when enabled.
+
+    With `SHARED_CACHE=true` and a `SHARED_STATE_DIR` (set by the multi-worker
+    supervisor) entries live in a SQLite file on the host; otherwise each
+    process keeps its own LRU.
+    """
+    cache = _caches.get(namespace)
+    if cache is None:
+        shared_dir = os.getenv("SHARED_STATE_DIR")
+        if SHARED_CACHE and shared_dir:
+            cache = SharedCache(Path(shared_dir) / "cache.sqlite3",
+                                namespace, maxsize=maxsize, ttl=ttl)
+        else:
+            cache = LocalCache(maxsize=maxsize, ttl=ttl)
+        _caches[namespace] = cache
+    return cache
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from typing import Dict, Literal
+
+from .logger import logger
+from .metrics import metrics
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+_state_gauge = metrics.gauge(
+    "circuit_breaker_state",
+    "Circuit state per upstream (0 closed, 1 half-open, 2 open)",
+    ["upstream"],
+)
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    `allow()` returns False for `recovery_timeout` seconds. The next call is
+    then let through as a probe: success closes the circuit, failure opens it
+    again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state: CircuitState = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        _state_gauge.set(0, upstream=name)
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == "open" and self._probe_due():
+            return "half_open"
+        return self._state
+
+    def _probe_due(self) -> bool:
+        return time.monotonic() - self._opened_at >= self.recovery_timeout
+
+    def _set_state(self, state: CircuitState) -> None:
+        if state != self._state:
+            logger.warning("circuit {} {} -> {}", self.name, self._state, state)
+        self._state = state
+        _state_gauge.set(_STATE_VALUES[state], upstream=self.name)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._probe_due():
+                # Let one probe through per recovery period.
+                self._opened_at = time.monotonic()
+                self._set_state("half_open")
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state != "closed":
+                self._set_state("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state("open")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers.setdefault(name, CircuitBreaker(
+            name,
+            failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)),
+            recovery_timeout=float(os.getenv("CIRCUIT_RECOVERY_SECONDS", 30)),
+        ))
+    return breaker
+
+
+def all_breakers() -> Dict[str, CircuitBreaker]:
+    return dict(_breakers)
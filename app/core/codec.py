@@ -0,0 +1,70 @@
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Callable, Optional, Union
+
+from starlette.responses import JSONResponse as _StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: `pip install orjson`
+    orjson = None
+
+# `auto` uses orjson when it is installed; `stdlib` forces the json module.
+JSON_CODEC = os.getenv("JSON_CODEC", "auto").lower()
+
+_fast = orjson is not None and JSON_CODEC != "stdlib"
+codec_name = "orjson" if _fast else "stdlib"
+
+JSONDecodeError = json.JSONDecodeError
+
+Default = Callable[[Any], Any]
+
+
+def _default(value: Any) -> Any:
+    """Encodes the non-JSON types that reach the codec: pydantic models
+    (tool calls, SDK objects) and datetimes."""
+    model_dump = getattr(value, "model_dump", None)
+    if model_dump is not None:
+        return model_dump(mode="json", exclude_unset=True, by_alias=True)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Parses JSON. Errors are `JSONDecodeError` (a `ValueError`) either way."""
+    if _fast:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumpb(value: Any, *, sort_keys: bool = False, default: Optional[Default] = None) -> bytes:
+    """Compact UTF-8 JSON bytes, non-ASCII kept as is."""
+    if _fast:
+        try:
+            return orjson.dumps(value, default=default or _default,
+                                option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits, non-str keys: let the stdlib decide.
+            pass
+    return _stdlib_dumps(value, sort_keys, default).encode("utf-8")
+
+
+def dumps(value: Any, *, sort_keys: bool = False, default: Optional[Default] = None) -> str:
+    """Like `dumpb`, as text."""
+    if _fast:
+        return dumpb(value, sort_keys=sort_keys, default=default).decode("utf-8")
+    return _stdlib_dumps(value, sort_keys, default)
+
+
+def _stdlib_dumps(value: Any, sort_keys: bool, default: Optional[Default]) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=sort_keys,
+                      separators=(",", ":"), default=default or _default)
+
+
+class JSONResponse(_StarletteJSONResponse):
+    """`JSONResponse` rendered through the codec; the app's default."""
+
+    def render(self, content: Any) -> bytes:
+        return dumpb(content)
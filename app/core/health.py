@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .circuit import all_breakers
+from .lifecycle import Lifecycle
+from .logger import logger
+from .monitor import LoopMonitor
+
+CheckResult = Tuple[bool, Any]
+Check = Callable[[], Awaitable[CheckResult]]
+
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL_SECONDS", 5))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", 2))
+MAX_LOOP_LAG_MS = float(os.getenv("HEALTH_MAX_LOOP_LAG_MS", 500))
+MAX_INFLIGHT = int(os.getenv("MAX_INFLIGHT", 64))
+
+
+class HealthMonitor:
+    """Refreshes component health in the background for the probes.
+
+    Probes only read `status`; all I/O happens in `refresh()`, which runs
+    every `interval` seconds. Checks registered with `critical=False` are
+    reported but do not flip readiness.
+    """
+
+    def __init__(self, interval: float = HEALTH_INTERVAL):
+        self.interval = interval
+        self._checks: Dict[str, Tuple[Check, bool]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.status: Dict[str, Any] = {
+            "status": "DOWN", "components": {}, "checked_at": None}
+
+    def add_check(self, name: str, check: Check, critical: bool = True) -> None:
+        self._checks[name] = (check, critical)
+
+    async def _run_check(self, name: str, check: Check) -> CheckResult:
+        try:
+            return await asyncio.wait_for(check(), timeout=HEALTH_CHECK_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False, "check timed out"
+        except Exception as e:
+            logger.warning("health check {} failed: {}", name, e)
+            return False, str(e)
+
+    async def refresh(self) -> Dict[str, Any]:
+        names = list(self._checks)
+        results = await asyncio.gather(
+            *(self._run_check(name, self._checks[name][0]) for name in names))
+
+        components = {}
+        healthy = True
+        for name, (ok, detail) in zip(names, results):
+            critical = self._checks[name][1]
+            components[name] = {
+                "status": "UP" if ok else "DOWN",
+                "critical": critical,
+                "detail": detail,
+            }
+            if critical and not ok:
+                healthy = False
+
+        previous = self.status["status"]
+        self.status = {
+            "status": "UP" if healthy else "DOWN",
+            "components": components,
+            "checked_at": time.time(),
+        }
+        if previous != self.status["status"]:
+            logger.info("health {} -> {}", previous, self.status["status"])
+        return self.status
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+
+def tcp_check(url: str, timeout: float = 1.0) -> Check:
+    """Reachability of the host and port behind `url`."""
+    parts = urlsplit(url)
+    host = parts.hostname
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+
+    async def check() -> CheckResult:
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), timeout=timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            return False, f"{host}:{port} unreachable: {e!r}"
+        writer.close()
+        return True, {"connect_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    return check
+
+
+def circuit_check() -> Check:
+    async def check() -> CheckResult:
+        states = {name: breaker.state for name,
+                  breaker in all_breakers().items()}
+        return all(state != "open" for state in states.values()), states
+
+    return check
+
+
+def loop_lag_check(monitor: LoopMonitor, max_lag_ms: float = MAX_LOOP_LAG_MS) -> Check:
+    async def check() -> CheckResult:
+        if not monitor.running:
+            return True, "monitor disabled"
+        lag = monitor.snapshot()["lag_ms"]["p99"]
+        return lag <= max_lag_ms, {"p99_ms": lag, "max_ms": max_lag_ms}
+
+    return check
+
+
+def capacity_check(lifecycle: Lifecycle, max_inflight: int = MAX_INFLIGHT) -> Check:
+    async def check() -> CheckResult:
+        inflight = lifecycle.inflight
+        return inflight < max_inflight, {"inflight": inflight, "max": max_inflight}
+
+    return check
+
+
+def registration_check(get_manager: Callable[[], Any]) -> Check:
+    async def check() -> CheckResult:
+        manager = get_manager()
+        if manager is None:
+            return True, "disabled"
+        if not manager._registered:
+            return False, getattr(manager, "last_error", "Not registered")
+        return True, "registered"
+
+    return check
+
+
+health_monitor = HealthMonitor()
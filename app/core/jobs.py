@@ -0,0 +1,319 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional
+
+from . import codec
+from .lifecycle import ServiceDraining, lifecycle
+from .logger import logger
+from .metrics import metrics
+
+JobStatus = Literal["pending", "running", "succeeded", "failed", "cancelled"]
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "data/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", 1000))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL_SECONDS", 3600))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 600))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 2))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", 0.5))
+
+_jobs_total = metrics.counter(
+    "jobs_total", "Finished jobs by kind and status", ["kind", "status"])
+_job_seconds = metrics.histogram(
+    "job_duration_seconds", "Job run time from claim to finish", ["kind"])
+_job_wait_seconds = metrics.histogram(
+    "job_queue_wait_seconds", "Time jobs spent pending before a worker claimed them", ["kind"])
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """Persistent job queue in a local SQLite file.
+
+    Workers of every process on the host can share the file. A claimed job
+    holds a lease that its worker keeps renewing; if its process dies the
+    lease expires and the job is claimed again until it has been attempted
+    `max_attempts` times. Finished
+    jobs are kept for `result_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        path: str = JOB_QUEUE_PATH,
+        max_pending: int = JOB_MAX_PENDING,
+        result_ttl: float = JOB_RESULT_TTL,
+        lease: float = JOB_LEASE_SECONDS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+    ):
+        self.path = Path(path)
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._initialized = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5,
+                                   isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._initialized:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    "id TEXT PRIMARY KEY, kind TEXT, payload TEXT, priority INTEGER, "
+                    "status TEXT, attempts INTEGER DEFAULT 0, result TEXT, error TEXT, "
+                    "created_at REAL, started_at REAL, finished_at REAL, "
+                    "lease_until REAL, expires_at REAL)")
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS jobs_claim "
+                    "ON jobs (status, priority DESC, created_at)")
+                self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = codec.loads(job["payload"])
+        if job["result"] is not None:
+            job["result"] = codec.loads(job["result"])
+        job.pop("lease_until")
+        return job
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0) -> Dict[str, Any]:
+        conn = self._conn()
+        pending = conn.execute(
+            "SELECT count(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+        if pending >= self.max_pending:
+            raise QueueFull(f"{pending} jobs pending")
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO jobs (id, kind, payload, priority, status, created_at) "
+            "VALUES (?, ?, ?, ?, 'pending', ?)",
+            (job_id, kind, codec.dumps(payload), priority, time.time()))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time())).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def claim(self, kinds: List[str]) -> Optional[Dict[str, Any]]:
+        """Take the highest priority runnable job, oldest first."""
+        now = time.time()
+        conn = self._conn()
+        marks = ",".join("?" * len(kinds))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE kind IN ({marks}) AND ("
+                "status = 'pending' OR "
+                "(status = 'running' AND lease_until < ? AND attempts < ?)) "
+                "ORDER BY priority DESC, created_at ASC LIMIT 1",
+                (*kinds, now, self.max_attempts)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                "started_at = ?, lease_until = ? WHERE id = ?",
+                (now, now + self.lease, row["id"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def renew(self, job_id: str) -> bool:
+        """Extend the lease of a job this process is still running."""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+            (time.time() + self.lease, job_id))
+        return cursor.rowcount > 0
+
+    def finish(self, job_id: str, status: JobStatus, result: Any = None, error: Optional[str] = None) -> None:
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, "
+            "expires_at = ? WHERE id = ?",
+            (status, codec.dumps(result), error,
+             now, now + self.result_ttl, job_id))
+
+    def release(self, job_id: str) -> None:
+        """Put a claimed job back without counting the attempt."""
+        self._conn().execute(
+            "UPDATE jobs SET status = 'pending', attempts = attempts - 1, "
+            "started_at = NULL, lease_until = NULL WHERE id = ? AND status = 'running'",
+            (job_id,))
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that no worker has claimed yet."""
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ?, expires_at = ? "
+            "WHERE id = ? AND status = 'pending'",
+            (now, now + self.result_ttl, job_id))
+        return cursor.rowcount > 0
+
+    def fail_exhausted(self) -> int:
+        """Fail jobs whose lease expired after their last allowed attempt."""
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired', "
+            "finished_at = ?, expires_at = ? "
+            "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+            (now, now + self.result_ttl, now, self.max_attempts))
+        return cursor.rowcount
+
+    def purge(self) -> int:
+        cursor = self._conn().execute(
+            "DELETE FROM jobs WHERE expires_at < ?", (time.time(),))
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute(
+            "SELECT status, count(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class JobWorkerPool:
+    """Runs queued jobs on `concurrency` asyncio workers in this process.
+
+    Each running job counts as in-flight work for the lifecycle, so draining
+    waits for it; once draining starts the workers stop claiming and the
+    remaining pending jobs are left for the next process.
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int = JOB_WORKERS,
+                 poll_interval: float = JOB_POLL_INTERVAL):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0) -> Dict[str, Any]:
+        if kind not in self._handlers:
+            raise ValueError(f"unknown job kind: {kind}")
+        job = await asyncio.to_thread(self.queue.submit, kind, payload, priority)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.queue.get, job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        return await asyncio.to_thread(self.queue.cancel, job_id)
+
+    async def subscribe(self, job_id: str):
+        """Yield the job each time its status changes, ending once it finishes."""
+        status = None
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            if job["status"] != status:
+                status = job["status"]
+                yield job
+            if status in FINISHED:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if self._tasks or self.concurrency <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(index))
+                       for index in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._housekeeping()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _housekeeping(self) -> None:
+        while True:
+            try:
+                failed = await asyncio.to_thread(self.queue.fail_exhausted)
+                purged = await asyncio.to_thread(self.queue.purge)
+                if failed or purged:
+                    logger.info("jobs: {} lease-expired, {} purged", failed, purged)
+            except sqlite3.Error as e:
+                logger.warning("job housekeeping failed: {}", e)
+            await asyncio.sleep(60)
+
+    async def _work(self, index: int) -> None:
+        kinds = list(self._handlers)
+        while lifecycle.accepting:
+            try:
+                job = await asyncio.to_thread(self.queue.claim, kinds)
+            except sqlite3.Error as e:
+                logger.warning("job claim failed: {}", e)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _renew(self, job_id: str) -> None:
+        """Keep a running job's lease from expiring while its handler works."""
+        while True:
+            await asyncio.sleep(self.queue.lease / 3)
+            try:
+                await asyncio.to_thread(self.queue.renew, job_id)
+            except sqlite3.Error as e:
+                logger.warning("job {} lease renewal failed: {}", job_id, e)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        kind = job["kind"]
+        _job_wait_seconds.observe(job["started_at"] - job["created_at"], kind=kind)
+        renewal = asyncio.create_task(self._renew(job["id"]))
+        try:
+            async with lifecycle.track():
+                try:
+                    result = await self._handlers[kind](job["payload"])
+                except Exception as e:
+                    logger.error("job {} ({}) failed: {}", job["id"], kind, e)
+                    status, result, error = "failed", None, str(e)
+                else:
+                    status, error = "succeeded", None
+        except ServiceDraining:
+            await asyncio.to_thread(self.queue.release, job["id"])
+            return
+        except asyncio.CancelledError:
+            # Hard stop: hand the job back instead of waiting for the lease.
+            await asyncio.shield(asyncio.to_thread(self.queue.release, job["id"]))
+            raise
+        finally:
+            renewal.cancel()
+
+        await asyncio.to_thread(self.queue.finish, job["id"], status, result, error)
+        _jobs_total.inc(kind=kind, status=status)
+        _job_seconds.observe(time.time() - job["started_at"], kind=kind)
@@ -0,0 +1,96 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List, Literal
+
+from .logger import logger
+from .metrics import metrics
+
+State = Literal["starting", "ready", "draining", "stopped"]
+
+DRAIN_GRACE_SECONDS = float(os.getenv("DRAIN_GRACE_SECONDS", 30))
+
+_inflight_gauge = metrics.gauge(
+    "agent_inflight", "Agent loops and streams currently running")
+
+
+class ServiceDraining(Exception):
+    pass
+
+
+class Lifecycle:
+    """Process state shared by the lifespan, the probes and the agent routes.
+
+    Long-running work (agent loops, result streams) runs inside `track()`.
+    Once `drain()` starts, readiness reports DOWN, drain hooks such as the
+    Nacos deregistration run first, new work is rejected with
+    `ServiceDraining`, and the tracked work gets up to the grace period to
+    finish before upstream pools are closed.
+    """
+
+    def __init__(self, grace: float = DRAIN_GRACE_SECONDS):
+        self.grace = grace
+        self.state: State = "starting"
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._drain_hooks: List[Callable[[], Awaitable[None]]] = []
+        self._drain_task: asyncio.Task = None
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def accepting(self) -> bool:
+        return self.state in ("starting", "ready")
+
+    def mark_ready(self) -> None:
+        if self.state == "starting":
+            self.state = "ready"
+
+    def add_drain_hook(self, hook: Callable[[], Awaitable[None]]) -> None:
+        self._drain_hooks.append(hook)
+
+    @asynccontextmanager
+    async def track(self):
+        if not self.accepting:
+            raise ServiceDraining("service is draining")
+        self._inflight += 1
+        self._idle.clear()
+        _inflight_gauge.set(self._inflight)
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            _inflight_gauge.set(self._inflight)
+            if self._inflight == 0:
+                self._idle.set()
+
+    async def drain(self) -> None:
+        """Start draining (idempotent) and wait for it to complete."""
+        if self._drain_task is None:
+            self._drain_task = asyncio.ensure_future(self._drain())
+        await asyncio.shield(self._drain_task)
+
+    async def _drain(self) -> None:
+        self.state = "draining"
+        logger.info("Draining: {} agent loops in flight, grace {}s",
+                    self._inflight, self.grace)
+
+        for hook in self._drain_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Drain hook failed: {str(e)}")
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.grace)
+            logger.info("Drained")
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Drain grace expired with {} agent loops in flight", self._inflight)
+        self.state = "stopped"
+
+
+lifecycle = Lifecycle()
@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Dict, List, Literal, Optional, Tuple
+
+from .logger import logger
+from .metrics import metrics
+
+Outcome = Literal["success", "overload"]
+
+_limit_gauge = metrics.gauge(
+    "upstream_concurrency_limit", "Adaptive concurrency window per upstream", ["upstream"])
+_inflight_gauge = metrics.gauge(
+    "upstream_inflight", "Requests in flight per upstream", ["upstream"])
+_queued_gauge = metrics.gauge(
+    "upstream_queued", "Requests waiting for a slot per upstream", ["upstream"])
+_queue_wait = metrics.histogram(
+    "upstream_queue_wait_seconds", "Time spent waiting for an upstream slot", ["upstream"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+
+
+class LimiterTimeout(Exception):
+    pass
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency window for one upstream, with a priority queue.
+
+    Each success at or below `tolerance` times the baseline latency (a
+    slowly drifting minimum) widens the window by 1/limit, i.e. by about one
+    slot per window's worth of requests, as long as the window is actually
+    being used. A 429, a 5xx or a slow response shrinks it by `backoff`, at
+    most once per observed latency, so a burst of failures from one
+    overloaded moment counts once.
+
+    Latencies should only be reported where they track load rather than
+    output length, such as the time to first token of a stream; other
+    responses are reported without one.
+
+    Slots are handed out on the event loop, highest `priority` first (FIFO
+    within a priority). Observations may come from any thread.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        backoff: float = 0.7,
+        tolerance: float = 2.0,
+        queue_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.queue_timeout = queue_timeout
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._inflight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._order = itertools.count()
+        self._baseline: Optional[float] = None
+        self._latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        _limit_gauge.set(self.limit, upstream=name)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: int = 0) -> None:
+        started = time.perf_counter()
+        if self._inflight < self.limit and not self._waiters:
+            self._admit()
+        else:
+            self._loop = asyncio.get_running_loop()
+            future = self._loop.create_future()
+            entry = (-priority, next(self._order), future)
+            heapq.heappush(self._waiters, entry)
+            _queued_gauge.set(len(self._waiters), upstream=self.name)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if future.done() and not future.cancelled():
+                    # Granted just as we gave up: hand the slot on.
+                    self.release()
+                else:
+                    future.cancel()
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    _queued_gauge.set(len(self._waiters), upstream=self.name)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise LimiterTimeout(
+                        f"no {self.name} slot within {self.queue_timeout}s") from None
+                raise
+        _queue_wait.observe(time.perf_counter() - started, upstream=self.name)
+
+    def _admit(self) -> None:
+        self._inflight += 1
+        _inflight_gauge.set(self._inflight, upstream=self.name)
+
+    def release(self) -> None:
+        self._inflight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        """Hands free slots to the waiters, on the event loop."""
+        while self._waiters and self._inflight < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._admit()
+                future.set_result(None)
+        _queued_gauge.set(len(self._waiters), upstream=self.name)
+        _inflight_gauge.set(self._inflight, upstream=self.name)
+
+    def observe(self, outcome: Outcome, latency: Optional[float] = None) -> None:
+        """Feeds one response back into the window; thread-safe."""
+        with self._lock:
+            if latency is not None:
+                self._track_latency(latency)
+            slow = (latency is not None and self._baseline is not None
+                    and latency > self._baseline * self.tolerance)
+            if outcome == "overload" or slow:
+                self._decrease("overload" if outcome == "overload" else "latency")
+            elif self._inflight >= self._limit / 2:
+                previous = self.limit
+                self._set_limit(self._limit + 1 / self._limit)
+                if self.limit > previous and self._waiters:
+                    self._wake_soon()
+
+    def _wake_soon(self) -> None:
+        # Called from any thread: the waiters' futures belong to the loop.
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            pass  # loop closed
+
+    def _track_latency(self, latency: float) -> None:
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            # Drift up slowly so the baseline follows a lasting change.
+            self._baseline += (latency - self._baseline) * 0.01
+        self._latency = latency if self._latency is None else self._latency * 0.9 + latency * 0.1
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self._latency or 0.0):
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._set_limit(self._limit * self.backoff)
+        if self.limit != previous:
+            logger.warning("{} concurrency limit {} -> {} ({})",
+                           self.name, previous, self.limit, reason)
+
+    def _set_limit(self, value: float) -> None:
+        self._limit = max(float(self.min_limit), min(value, float(self.max_limit)))
+        _limit_gauge.set(self.limit, upstream=self.name)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "limit": self.limit,
+            "inflight": self._inflight,
+            "queued": len(self._waiters),
+            "baseline_ms": round(self._baseline * 1000, 1) if self._baseline is not None else None,
+            "latency_ms": round(self._latency * 1000, 1) if self._latency is not None else None,
+        }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters.setdefault(name, AdaptiveLimiter(
+            name,
+            initial=int(os.getenv("LIMITER_INITIAL", 16)),
+            min_limit=int(os.getenv("LIMITER_MIN", 1)),
+            max_limit=int(os.getenv("LIMITER_MAX", 256)),
+            backoff=float(os.getenv("LIMITER_BACKOFF", 0.7)),
+            tolerance=float(os.getenv("LIMITER_LATENCY_TOLERANCE", 2.0)),
+            queue_timeout=float(os.getenv("LIMITER_QUEUE_TIMEOUT_SECONDS", 30)),
+        ))
+    return limiter
+
+
+def all_limiters() -> Dict[str, AdaptiveLimiter]:
+    return dict(_limiters)
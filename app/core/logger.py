@@ -1,11 +1,170 @@
+import atexit
 import logging
 import os
+import queue
+import random
 import sys
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
+from typing import Any, List, Optional
 
 from asgi_correlation_id.context import correlation_id
 from loguru import logger
 
+from . import codec
+from .tracing import tracer
+
+MAX_FIELD_SIZE = int(os.getenv("LOG_MAX_FIELD_SIZE", 512))
+SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.1))
+
+
+class clip:
+    """Defers `str()` of a log argument and caps it at `limit` characters.
+
+    Use as a positional argument so nothing is rendered unless the record is
+    actually emitted: `logger.debug("args: {}", clip(args))`.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = MAX_FIELD_SIZE):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = str(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}...<{len(text) - self.limit} more chars>"
+
+    __repr__ = __str__
+
+    def __format__(self, spec: str) -> str:
+        return format(str(self), spec)
+
+
+def sampled(rate: float = SAMPLE_RATE) -> bool:
+    """Return True for roughly `rate` of calls; guards verbose log events."""
+    return rate >= 1.0 or random.random() < rate
+
+
+def _to_json(record) -> str:
+    data = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "correlation_id": record.get("correlation_id"),
+        "name": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    span = tracer.current_span()
+    if span is not None:
+        data["trace_id"] = span.trace_id
+        data["span_id"] = span.span_id
+    if record["extra"]:
+        data["extra"] = record["extra"]
+    if record["exception"] is not None:
+        data["exception"] = repr(record["exception"].value)
+    return codec.dumps(data, default=str)
+
+
+class BatchFileSink:
+    """Loguru sink that writes daily log files from a background thread.
+
+    The calling thread only renders the line and puts it on a queue; the
+    writer drains the queue in batches of up to `batch_size` lines or every
+    `flush_interval` seconds, whichever comes first.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        dir: Path,
+        serialize: bool = False,
+        retention_days: int = 30,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+    ):
+        self.dir = dir
+        self.serialize = serialize
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._file = None
+        self._date: Optional[str] = None
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def __call__(self, message) -> None:
+        if self.serialize:
+            self._queue.put(_to_json(message.record) + "\n")
+        else:
+            self._queue.put(str(message))
+
+    def stop(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch: List[str] = []
+            stop = item is self._STOP
+            if not stop:
+                batch.append(item)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._write(batch)
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                return
+
+    def _write(self, batch: List[str]) -> None:
+        date = datetime.now().strftime("%Y-%m-%d")
+        if date != self._date:
+            if self._file is not None:
+                self._file.close()
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.dir / f"app_{date}.log",
+                              "a", encoding="utf-8")
+            self._date = date
+            self._cleanup()
+
+        self._file.write("".join(batch))
+        self._file.flush()
+
+    def _cleanup(self) -> None:
+        cutoff = time.time() - self.retention_days * 86400
+        for path in self.dir.glob("app_*.log"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                continue
+
 
 class Logger:
     def __init__(
@@ -14,16 +173,21 @@ class Logger:
         dir: str = "logs",
         retention: str = "30 days",
         rotation: str = "00:00",
+        level: str = "INFO",
+        serialize: bool = False,
+        diagnose: bool = False,
     ):
         self.env = env
         self.dir = Path(dir)
         self.retention = retention
         self.rotation = rotation
+        self.level = level
+        self.serialize = serialize
+        self.diagnose = diagnose
 
         self.format = "{time:YYYY-MM-DD HH:mm:ss.SSS} [{correlation_id}] | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
-        self.dir.mkdir(exist_ok=True)
         self.configure()
-        # self._intercept_handler()
+        self._intercept_handler()
 
     def configure(self) -> None:
         logger.remove()
@@ -39,28 +203,47 @@ class Logger:
 
     def _correlation_id_filter(self, record):
         record["correlation_id"] = correlation_id.get()
-        return record["correlation_id"]
+        return True
+
+    def _retention_days(self) -> int:
+        try:
+            return int(self.retention.split()[0])
+        except (ValueError, IndexError):
+            return 30
 
     def _add_console_handler(self) -> None:
+        if self.serialize:
+            logger.add(
+                sink=lambda message: sys.stdout.write(
+                    _to_json(message.record) + "\n"),
+                format="{message}",
+                level=self.level,
+                filter=self._correlation_id_filter,
+                diagnose=False,
+            )
+            return
+
         logger.add(
             sink=sys.stdout,
             format=self.format,
-            level="DEBUG",
+            level=self.level,
             filter=self._correlation_id_filter,
             colorize=True,
-            backtrace=True,
-            diagnose=True,
+            backtrace=self.diagnose,
+            diagnose=self.diagnose,
         )
 
     def _add_file_handler(self) -> None:
         logger.add(
-            sink=self.dir / "app_{time:YYYY-MM-DD}.log",
-            format=self.format,
-            rotation="00:00",
-            retention="30 days",
-            level="INFO",
+            sink=BatchFileSink(
+                self.dir,
+                serialize=self.serialize,
+                retention_days=self._retention_days(),
+            ),
+            format="{message}" if self.serialize else self.format,
+            level=self.level,
             filter=self._correlation_id_filter,
-            enqueue=True,
+            colorize=False,
             diagnose=False,
         )
 
@@ -83,15 +266,21 @@ class Logger:
                     level, record.getMessage()
                 )
 
-        logging.basicConfig(handlers=[InterceptHandler()], level=logging.INFO)
+        logging.basicConfig(handlers=[InterceptHandler()],
+                            level=self.level, force=True)
 
         for name in ["uvicorn", "uvicorn.access", "uvicorn.error"]:
             logging.getLogger(name).handlers = []
             logging.getLogger(name).propagate = True
 
 
+_env = os.getenv("ENV", "dev")
+
 logger = Logger(
-    env=os.getenv("ENV", "dev"),
+    env=_env,
     dir=os.getenv("LOG_DIR", "logs"),
     retention=os.getenv("LOG_RETENTION", "30 days"),
+    level=os.getenv("LOG_LEVEL", "DEBUG" if _env == "dev" else "INFO").upper(),
+    serialize=os.getenv("LOG_FORMAT", "text") == "json",
+    diagnose=os.getenv("LOG_DIAGNOSE", "false").lower() == "true",
 ).get_logger()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from .logger import logger
+from .metrics import metrics
+
+_lag_histogram = metrics.histogram(
+    "event_loop_lag_seconds",
+    "Delay between a scheduled loop wake-up and when it actually ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+_lag_last = metrics.gauge(
+    "event_loop_lag_last_seconds",
+    "Loop lag measured by the most recent monitor tick",
+)
+_blocked_total = metrics.counter(
+    "event_loop_blocked_total",
+    "Times the loop was blocked longer than the configured threshold",
+)
+
+
+class BlockingEvent:
+    __slots__ = ("started_at", "duration", "stack")
+
+    def __init__(self, started_at: float, duration: float, stack: List[str]):
+        self.started_at = started_at
+        self.duration = duration
+        self.stack = stack
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "stack": self.stack,
+        }
+
+
+class LoopMonitor:
+    """Measures event-loop lag and captures stacks of blocking callbacks.
+
+    A coroutine on the monitored loop wakes up every `interval` seconds and
+    records how late it was. A watchdog thread checks the last wake-up; once
+    the loop has been silent for more than `threshold` seconds it grabs the
+    loop thread's current stack, which is the callback that is blocking it.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.05,
+        threshold: float = 0.1,
+        max_events: int = 50,
+        window: int = 1200,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._events: Deque[BlockingEvent] = deque(maxlen=max_events)
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stall: Optional[BlockingEvent] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _tick(self) -> None:
+        while True:
+            self._last_tick = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - self._last_tick - self.interval)
+            self._samples.append(lag)
+            _lag_histogram.observe(lag)
+            _lag_last.set(lag)
+
+            with self._lock:
+                stall, self._stall = self._stall, None
+            if stall is not None:
+                stall.duration = lag
+                logger.warning("event loop blocked for {:.0f} ms at:\n{}",
+                               lag * 1000, "".join(stall.stack[-6:]))
+
+    def _watch(self) -> None:
+        poll = max(self.threshold / 2, 0.01)
+        while not self._stopped.wait(poll):
+            silent = time.monotonic() - self._last_tick - self.interval
+            if silent < self.threshold:
+                continue
+            with self._lock:
+                if self._stall is not None:
+                    self._stall.duration = silent
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                self._stall = BlockingEvent(
+                    started_at=time.time() - silent,
+                    duration=silent,
+                    stack=traceback.format_stack(frame),
+                )
+                self._events.append(self._stall)
+            _blocked_total.inc()
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+        current = max(0.0, time.monotonic() -
+                      self._last_tick - self.interval)
+
+        def pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+        max_lag = samples[-1] if samples else 0.0
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "current_lag_ms": round(current * 1000, 3),
+            "lag_ms": {
+                "p50": round(pct(50) * 1000, 3),
+                "p99": round(pct(99) * 1000, 3),
+                "max": round(max_lag * 1000, 3),
+            },
+            "blocked_total": int(_blocked_total.value()),
+            "blocking_events": [event.to_dict() for event in reversed(self._events)],
+        }
+
+
+loop_monitor = LoopMonitor(
+    interval=float(os.getenv("LOOP_MONITOR_INTERVAL_MS", 50)) / 1000,
+    threshold=float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 100)) / 1000,
+)
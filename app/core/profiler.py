@@ -0,0 +1,140 @@
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+MAX_PROFILE_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", 120))
+MIN_SAMPLE_INTERVAL = 0.001
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    cwd = os.getcwd()
+    if filename.startswith(cwd):
+        filename = filename[len(cwd) + 1:]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Wall-clock sampler over every Python thread of the worker.
+
+    Stacks are aggregated in the collapsed format understood by
+    flamegraph.pl, speedscope and inferno: `thread;outer;...;inner count`.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        # Written so NaN is clamped too: zero would busy-spin the sampler.
+        self.interval = interval if interval >= MIN_SAMPLE_INTERVAL else MIN_SAMPLE_INTERVAL
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cpu-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        lines = [f"{stack} {count}" for stack,
+                 count in self._stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+
+class ProfilingService:
+    """Runs one CPU or memory profile at a time on the live worker."""
+
+    def __init__(self):
+        self._busy = False
+
+    def _acquire(self, seconds: float) -> float:
+        if self._busy:
+            raise ProfilerBusy("a profile is already running on this worker")
+        self._busy = True
+        if not math.isfinite(seconds):
+            # NaN would reach `asyncio.sleep` through min/max unchanged.
+            seconds = MAX_PROFILE_SECONDS if seconds > 0 else 0.1
+        return min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+
+    async def profile_cpu(self, seconds: float, interval: float = 0.005) -> str:
+        seconds = self._acquire(seconds)
+        profiler = SamplingProfiler(interval=interval)
+        try:
+            profiler.start()
+            await asyncio.sleep(seconds)
+        finally:
+            stacks = profiler.stop()
+            self._busy = False
+        return stacks
+
+    async def profile_memory(self, seconds: float, top: int = 25) -> Dict[str, Any]:
+        seconds = self._acquire(seconds)
+        started_here = not tracemalloc.is_tracing()
+        try:
+            if started_here:
+                tracemalloc.start(25)
+            before = tracemalloc.take_snapshot()
+            started = time.monotonic()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+            self._busy = False
+
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        stats = after.filter_traces(filters).compare_to(
+            before.filter_traces(filters), "lineno")
+        return {
+            "seconds": round(time.monotonic() - started, 3),
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "top": [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_diff_bytes": stat.size_diff,
+                    "size_bytes": stat.size,
+                    "count_diff": stat.count_diff,
+                    "count": stat.count,
+                }
+                for stat in stats[:top]
+            ],
+        }
+
+
+profiling_service = ProfilingService()
@@ -1,16 +1,26 @@
 from typing import Any, Dict, Optional
 
-import yaml
-
 
 class AppSettings():
     def __init__(self,
                  data: Dict[str, Any] = None,
                  local_config_path: str = "data/config.yaml"
                  ):
-        self._config: Dict[str, Any] = {}
+        # The local config file is read on first access rather than at import.
+        self._data: Optional[Dict[str, Any]] = None
         self._local_config_path = local_config_path
-        self._init_config(data)
+        if data is not None:
+            self._init_config(data)
+
+    @property
+    def _config(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._init_config()
+        return self._data
+
+    @_config.setter
+    def _config(self, value: Dict[str, Any]) -> None:
+        self._data = value
 
     def _init_config(self, data: Optional[Dict[str, Any]] = None) -> None:
         if data is None:
@@ -29,6 +39,8 @@ class AppSettings():
                     item, dict) else item for item in value]
 
     def _load_local_config(self) -> Dict[str, Any]:
+        import yaml
+
         try:
             with open(self._local_config_path, "r") as f:
                 return yaml.safe_load(f) or {}
@@ -59,10 +71,12 @@ class AppSettings():
         value = self._config
 
         for k in keys:
-            value = value.get(k, {}) if isinstance(value, dict) else default
-            if value is default:
-                break
-        return value if value is not None else default
+            if isinstance(value, AppSettings):
+                value = value._config
+            value = value.get(k) if isinstance(value, dict) else None
+            if value is None:
+                return default
+        return value
 
     def __setitem__(self, key: str, value: Any) -> None:
         self._config[key] = value
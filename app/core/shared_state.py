@@ -0,0 +1,110 @@
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import codec
+from .logger import logger
+from .settings import app_settings
+
+APP_ROLE = os.getenv("APP_ROLE", "standalone")
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", "")
+SNAPSHOT_FILE = "config.json"
+
+
+def is_worker() -> bool:
+    return APP_ROLE == "worker"
+
+
+def write_config_snapshot(dir: str, data: Dict[str, Any]) -> None:
+    """Atomically replace the config snapshot shared with worker processes."""
+    path = Path(dir)
+    path.mkdir(parents=True, exist_ok=True)
+    payload = dict(data, updated_at=time.time())
+    fd, tmp = tempfile.mkstemp(dir=path, prefix=".config-", suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(codec.dumpb(payload, default=str))
+    os.replace(tmp, path / SNAPSHOT_FILE)
+
+
+class SharedConfig:
+    """Worker-side view of the supervisor's Nacos state.
+
+    Exposes the same attributes the probes and `/config` read from
+    `NacosManager`, backed by the snapshot file the supervisor maintains.
+    """
+
+    def __init__(self, dir: str, interval: float = 2.0):
+        self.path = Path(dir) / SNAPSHOT_FILE
+        self.interval = interval
+        self._mtime = 0.0
+        self._data: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[["SharedConfig"], None]] = []
+
+    @property
+    def _registered(self) -> bool:
+        return bool(self._data.get("registered"))
+
+    @property
+    def current_config(self) -> Dict[str, Any]:
+        return self._data.get("config") or {}
+
+    @property
+    def service_ip(self) -> Optional[str]:
+        return self._data.get("ip")
+
+    @property
+    def last_error(self) -> str:
+        return self._data.get("last_error") or "Not registered"
+
+    def add_listener(self, listener: Callable[["SharedConfig"], None]) -> None:
+        """Call `listener` whenever a new config is applied."""
+        self._listeners.append(listener)
+
+    def refresh(self) -> bool:
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+
+        try:
+            data = codec.loads(self.path.read_bytes())
+        except (OSError, ValueError) as e:
+            logger.warning("Config snapshot unreadable: {}", e)
+            return False
+
+        config_changed = data.get("config") != self._data.get("config")
+        self._mtime = mtime
+        self._data = data
+        if config_changed and data.get("config"):
+            app_settings.merge_config(data["config"])
+            logger.info("Config snapshot applied")
+            for listener in self._listeners:
+                try:
+                    listener(self)
+                except Exception as e:
+                    logger.error("Config listener failed: {}", e)
+        return True
+
+    async def start(self) -> None:
+        self.refresh()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.refresh()
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .cache import LocalCache
+from .metrics import metrics
+
+_coalesced_total = metrics.counter(
+    "singleflight_total", "Calls by how they were served", ["group", "outcome"])
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller starts the work as its own task; later callers with the
+    same key await the same result. The work is cancelled only once every
+    caller waiting on it has gone away. Successful results that pass
+    `reusable` (by default, any but None) are reused for `reuse_window`
+    seconds after completion.
+    """
+
+    def __init__(self, name: str, reuse_window: float = 0.0, maxsize: int = 1024,
+                 reusable: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.reuse_window = reuse_window
+        self._reusable = reusable or (lambda result: result is not None)
+        self._inflight: Dict[str, Tuple[asyncio.Task, list]] = {}
+        self._recent = LocalCache(maxsize=maxsize, ttl=reuse_window) if reuse_window > 0 else None
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self._recent is not None:
+            hit = self._recent.get(key, _MISSING)
+            if hit is not _MISSING:
+                _coalesced_total.inc(group=self.name, outcome="reused")
+                return hit
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn())
+            entry = self._inflight[key] = (task, [0])
+            task.add_done_callback(lambda t: self._done(key, t))
+            _coalesced_total.inc(group=self.name, outcome="leader")
+        else:
+            _coalesced_total.inc(group=self.name, outcome="joined")
+
+        task, waiters = entry
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if waiters[0] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if self._recent is not None and not task.cancelled() and task.exception() is None:
+            if self._reusable(task.result()):
+                self._recent.set(key, task.result())
@@ -0,0 +1,69 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .logger import logger
+from .metrics import metrics
+
+_phase_seconds = metrics.gauge(
+    "startup_phase_seconds", "Time spent in each startup phase", ["phase"])
+
+
+class StartupReport:
+    """Durations of the import and lifespan phases of this process.
+
+    Phases may overlap (clients are opened while Nacos registration runs),
+    so `total_ms` is measured from the first phase's start to `finish()`
+    rather than summed.
+    """
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float, float]] = []
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, name: str, started_at: float, ended_at: Optional[float] = None) -> None:
+        ended_at = ended_at if ended_at is not None else time.perf_counter()
+        with self._lock:
+            if self.started_at is None or started_at < self.started_at:
+                self.started_at = started_at
+            self.phases.append((name, started_at, ended_at))
+        _phase_seconds.set(ended_at - started_at, phase=name)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started_at)
+
+    def finish(self) -> None:
+        self.ready_at = time.perf_counter()
+        report = self.snapshot()
+        summary = ", ".join(f"{p['name']} {p['duration_ms']:.0f}ms"
+                            for p in report["phases"])
+        logger.info("startup finished in {:.0f}ms: {}",
+                    report["total_ms"], summary)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p[1])
+            base = self.started_at
+        total = None
+        if self.ready_at is not None and base is not None:
+            total = round((self.ready_at - base) * 1000, 1)
+        return {
+            "ready": self.ready_at is not None,
+            "total_ms": total,
+            "phases": [{
+                "name": name,
+                "offset_ms": round((started_at - base) * 1000, 1),
+                "duration_ms": round((ended_at - started_at) * 1000, 1),
+            } for name, started_at, ended_at in phases],
+        }
+
+
+startup_report = StartupReport()
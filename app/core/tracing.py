@@ -0,0 +1,205 @@
+import importlib
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+from asgi_correlation_id.context import correlation_id
+
+from . import codec
+
+CORRELATION_ID_HEADER = "X-Request-ID"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar(
+    "current_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "status",
+        "error",
+        "start_time",
+        "end_time",
+        "_start",
+        "_duration",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self._start = time.perf_counter()
+        self._duration: Optional[float] = None
+
+    @property
+    def duration_ms(self) -> float:
+        if self._duration is None:
+            return (time.perf_counter() - self._start) * 1000
+        return self._duration * 1000
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, error: Any) -> None:
+        self.status = "error"
+        self.error = str(error)
+
+    def end(self) -> None:
+        if self._duration is not None:
+            return
+        self._duration = time.perf_counter() - self._start
+        self.end_time = self.start_time + self._duration
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter:
+    """Receives every finished span. Subclass and override `export`."""
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self, max_spans: int = 10000):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id is None:
+            return spans
+        return [span for span in spans if span.trace_id == trace_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str = "logs/traces.jsonl"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        line = codec.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class Tracer:
+    def __init__(self, exporter: Optional[SpanExporter] = None):
+        self.exporter = exporter
+
+    def set_exporter(self, exporter: Optional[SpanExporter]) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+        self.exporter = exporter
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def start_span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        parent = _current_span.get()
+        if parent is not None:
+            trace_id = parent.trace_id
+            parent_id = parent.span_id
+        else:
+            trace_id = correlation_id.get() or uuid4().hex
+            parent_id = None
+
+        span = Span(name, trace_id, parent_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            if self.exporter is not None:
+                self.exporter.export(span)
+
+
+def propagation_headers() -> Dict[str, str]:
+    """Headers that carry the current correlation ID to upstream services."""
+    cid = correlation_id.get()
+    return {CORRELATION_ID_HEADER: cid} if cid else {}
+
+
+def load_exporter(name: str, path: str) -> Optional[SpanExporter]:
+    """Build an exporter from `none`, `memory`, `file` or a `module:Class` path."""
+    if not name or name == "none":
+        return None
+    if name == "memory":
+        return InMemorySpanExporter()
+    if name == "file":
+        return FileSpanExporter(path)
+
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+tracer = Tracer(
+    exporter=load_exporter(
+        os.getenv("TRACE_EXPORTER", "none"),
+        os.getenv("TRACE_FILE", "logs/traces.jsonl"),
+    )
+)
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Literal, Optional
+
+from .logger import logger
+from .metrics import metrics
+from .settings import app_settings
+
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "data/usage.sqlite3")
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", 30))
+USAGE_BUCKET_SECONDS = 60
+
+TOKEN_BUDGET_CONVERSATION = int(os.getenv("TOKEN_BUDGET_CONVERSATION", 0))
+TOKEN_BUDGET_CALLER = int(os.getenv("TOKEN_BUDGET_CALLER", 0))
+TOKEN_BUDGET_WINDOW_SECONDS = float(os.getenv("TOKEN_BUDGET_WINDOW_SECONDS", 3600))
+TOKEN_BUDGET_DOWNGRADE_RATIO = float(os.getenv("TOKEN_BUDGET_DOWNGRADE_RATIO", 0.8))
+BUDGET_FALLBACK_MODEL = os.getenv("BUDGET_FALLBACK_MODEL") or None
+
+BudgetDecision = Literal["ok", "downgrade", "stop"]
+
+_tokens_total = metrics.counter(
+    "llm_tokens_total", "Tokens reported by the scheduler", ["kind"])
+
+_FIELDS = ("prompt_tokens", "completion_tokens", "tool_calls", "requests")
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class RunUsage:
+    """Token usage of one agent conversation."""
+
+    __slots__ = ("caller", "prompt_tokens", "completion_tokens", "tool_calls", "requests")
+
+    def __init__(self, caller: str):
+        self.caller = caller
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tool_calls = 0
+        self.requests = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, int]:
+        return {field: getattr(self, field) for field in _FIELDS}
+
+
+class UsageTracker:
+    """Aggregates usage per caller in memory and flushes it to SQLite.
+
+    Usage is kept in one-minute buckets. Each flush adds this process's
+    deltas to the shared file and reloads the window totals of every caller,
+    so caller budgets see the usage of all workers on the host, at most one
+    flush interval late.
+    """
+
+    def __init__(self, path: str = USAGE_DB_PATH, window: float = TOKEN_BUDGET_WINDOW_SECONDS,
+                 interval: float = USAGE_FLUSH_SECONDS):
+        self.path = Path(path)
+        self.window = window
+        self.interval = interval
+        self._pending: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        self._flushed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, run: RunUsage, prompt_tokens: int, completion_tokens: int, tool_calls: int) -> None:
+        run.prompt_tokens += prompt_tokens
+        run.completion_tokens += completion_tokens
+        run.tool_calls += tool_calls
+        run.requests += 1
+        _tokens_total.inc(prompt_tokens, kind="prompt")
+        _tokens_total.inc(completion_tokens, kind="completion")
+
+        bucket = int(time.time() // USAGE_BUCKET_SECONDS * USAGE_BUCKET_SECONDS)
+        with self._lock:
+            totals = self._pending[(run.caller, bucket)]
+            for index, value in enumerate((prompt_tokens, completion_tokens, tool_calls, 1)):
+                totals[index] += value
+
+    def charge(self, caller: str, run: RunUsage) -> None:
+        """Bills `caller` for a run made on its behalf by another caller,
+        e.g. a coalesced one. Token metrics already counted the run."""
+        bucket = int(time.time() // USAGE_BUCKET_SECONDS * USAGE_BUCKET_SECONDS)
+        with self._lock:
+            totals = self._pending[(caller, bucket)]
+            for index, value in enumerate((run.prompt_tokens, run.completion_tokens,
+                                           run.tool_calls, run.requests)):
+                totals[index] += value
+
+    def window_tokens(self, caller: str) -> int:
+        since = time.time() - self.window
+        with self._lock:
+            pending = sum(totals[0] + totals[1]
+                          for (name, bucket), totals in self._pending.items()
+                          if name == caller and bucket >= since)
+        return self._flushed.get(caller, 0) + pending
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            "caller TEXT, bucket INTEGER, prompt_tokens INTEGER, completion_tokens INTEGER, "
+            "tool_calls INTEGER, requests INTEGER, PRIMARY KEY (caller, bucket))")
+        return conn
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: [0, 0, 0, 0])
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (caller, bucket) DO UPDATE SET "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                "tool_calls = tool_calls + excluded.tool_calls, "
+                "requests = requests + excluded.requests",
+                [(caller, bucket, *totals) for (caller, bucket), totals in pending.items()])
+            conn.execute("COMMIT")
+            rows = conn.execute(
+                "SELECT caller, sum(prompt_tokens + completion_tokens) FROM usage "
+                "WHERE bucket >= ? GROUP BY caller", (time.time() - self.window,)).fetchall()
+        except sqlite3.Error:
+            # Put the deltas back so the next flush retries them.
+            with self._lock:
+                for key, totals in pending.items():
+                    current = self._pending[key]
+                    for index, value in enumerate(totals):
+                        current[index] += value
+            raise
+        finally:
+            conn.close()
+        self._flushed = dict(rows)
+
+    def report(self, caller: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Window totals per caller, from the store (as of the last flush)."""
+        conn = self._connect()
+        try:
+            query = ("SELECT caller, sum(prompt_tokens), sum(completion_tokens), "
+                     "sum(tool_calls), sum(requests) FROM usage WHERE bucket >= ?")
+            params: list = [time.time() - self.window]
+            if caller is not None:
+                query += " AND caller = ?"
+                params.append(caller)
+            rows = conn.execute(query + " GROUP BY caller", params).fetchall()
+        finally:
+            conn.close()
+        return {row[0]: dict(zip(_FIELDS, row[1:])) for row in rows}
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except sqlite3.Error as e:
+                logger.warning("usage flush failed: {}", e)
+
+
+class TokenBudget:
+    """Per-conversation and per-caller token caps.
+
+    Past `downgrade_ratio` of either budget the agent switches to
+    `fallback_model` (when one is configured); past the budget it stops.
+    A caller's budget can be overridden in app settings under
+    `budgets.callers.<caller>`.
+    """
+
+    def __init__(
+        self,
+        tracker: UsageTracker,
+        conversation: int = TOKEN_BUDGET_CONVERSATION,
+        caller: int = TOKEN_BUDGET_CALLER,
+        downgrade_ratio: float = TOKEN_BUDGET_DOWNGRADE_RATIO,
+        fallback_model: Optional[str] = BUDGET_FALLBACK_MODEL,
+    ):
+        self.tracker = tracker
+        self.conversation = conversation
+        self.caller = caller
+        self.downgrade_ratio = downgrade_ratio
+        self.fallback_model = fallback_model
+
+    def caller_limit(self, caller: str) -> int:
+        return int(app_settings.get(f"budgets.callers.{caller}", self.caller))
+
+    def check(self, run: RunUsage) -> BudgetDecision:
+        ratios = []
+        if self.conversation > 0:
+            ratios.append(run.total_tokens / self.conversation)
+        caller_limit = self.caller_limit(run.caller)
+        if caller_limit > 0:
+            ratios.append(self.tracker.window_tokens(run.caller) / caller_limit)
+        usage = max(ratios, default=0.0)
+        if usage >= 1:
+            return "stop"
+        if usage >= self.downgrade_ratio and self.fallback_model is not None:
+            return "downgrade"
+        return "ok"
+
+
+usage_tracker = UsageTracker()
+token_budget = TokenBudget(usage_tracker)
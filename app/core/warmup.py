@@ -0,0 +1,53 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from .logger import logger
+from .startup import startup_report
+
+WARMUP = os.getenv("WARMUP", "true").lower() == "true"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", 30))
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", 4))
+WARMUP_COMPLETION = os.getenv("WARMUP_COMPLETION", "false").lower() == "true"
+
+Step = Callable[[], Awaitable[None]]
+
+
+class Warmup:
+    """Steps run once at startup, before the service reports ready.
+
+    Steps run concurrently, each bounded by `timeout`. A step that fails or
+    times out is logged and skipped: a cold service is better than one that
+    never becomes ready.
+    """
+
+    def __init__(self, timeout: float = WARMUP_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._steps: List[Tuple[str, Step]] = []
+        self.status: Dict[str, str] = {}
+
+    def add_step(self, name: str, step: Step) -> None:
+        self._steps.append((name, step))
+        self.status[name] = "pending"
+
+    async def run(self) -> Dict[str, str]:
+        await asyncio.gather(*(self._run_step(name, step)
+                               for name, step in self._steps))
+        return self.status
+
+    async def _run_step(self, name: str, step: Step) -> None:
+        self.status[name] = "running"
+        with startup_report.phase(f"warmup.{name}"):
+            try:
+                await asyncio.wait_for(step(), self.timeout)
+                self.status[name] = "ok"
+            except asyncio.TimeoutError:
+                self.status[name] = "timeout"
+                logger.warning("warm-up step {} timed out after {}s",
+                               name, self.timeout)
+            except Exception as e:
+                self.status[name] = "failed"
+                logger.warning("warm-up step {} failed: {}", name, e)
+
+
+warmup = Warmup()
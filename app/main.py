@@ -1,55 +1,166 @@
 #! /usr/bin/python3
 # -*- coding: utf-8 -*-
-import logging
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
 import shortuuid
-import uvicorn
 from asgi_correlation_id import CorrelationIdMiddleware
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-
-from app.core import app_settings
+from fastapi.responses import PlainTextResponse
+
+from app.core import app_settings, codec
+from app.core.health import (capacity_check, circuit_check, health_monitor,
+                             loop_lag_check, registration_check, tcp_check)
+from app.core.lifecycle import lifecycle
+from app.core.limiter import all_limiters
+from app.core.logger import logger
+from app.core.metrics import metrics
+from app.core.monitor import loop_monitor
+from app.core.profiler import ProfilerBusy, profiling_service
+from app.core.shared_state import SHARED_STATE_DIR, SharedConfig, is_worker
+from app.core.startup import startup_report
+from app.core.usage import usage_tracker
+from app.core.warmup import WARMUP, WARMUP_COMPLETION, WARMUP_CONNECTIONS, warmup
 from app.routers import agent, probes
 from app.services import nacos_manager
+from app.services.agents.capture import traffic_capture
+from app.services.jtai.images import image_pipeline
+from app.services.jtai.process_pool import process_pool
+from app.services.tools import tool_registry
 
 nacos: bool = os.getenv("NACOS", "true").lower() == "true"
+monitor_loop: bool = os.getenv("LOOP_MONITOR", "true").lower() == "true"
+upstream_critical: bool = os.getenv(
+    "HEALTH_UPSTREAM_CRITICAL", "true").lower() == "true"
+
+
+def close_search_client() -> None:
+    from app.services.tools.websearch import close_client
+
+    close_client()
+
+
+def register_health_checks(app: FastAPI) -> None:
+    from app.services.tools.websearch import VMP_SEARCH_URL
+
+    health_monitor.add_check("nacos", registration_check(
+        lambda: app.state.nacos_manager))
+    health_monitor.add_check("scheduler", tcp_check(
+        agent.SCHEDULER_BASE_URL), critical=upstream_critical)
+    health_monitor.add_check("search", tcp_check(
+        VMP_SEARCH_URL), critical=upstream_critical)
+    health_monitor.add_check("circuits", circuit_check(),
+                             critical=upstream_critical)
+    health_monitor.add_check("event_loop", loop_lag_check(loop_monitor))
+    health_monitor.add_check("capacity", capacity_check(lifecycle))
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+
+def register_warmup_steps() -> None:
+    warmup.add_step("scheduler", lambda: asyncio.to_thread(
+        agent.bot.warm, WARMUP_CONNECTIONS))
+    warmup.add_step("websearch", lambda: agent.websearch_agent.warm(
+        completion=WARMUP_COMPLETION))
+    # Caller budgets only see usage persisted by earlier processes after a flush.
+    warmup.add_step("usage", lambda: asyncio.to_thread(usage_tracker.flush))
+
+
+async def warm_up() -> None:
+    """Runs the warm-up steps, then lets the probes report UP."""
+    if WARMUP:
+        register_warmup_steps()
+        status = await warmup.run()
+        logger.info("warm-up finished: {}", status)
+    lifecycle.mark_ready()
+    startup_report.finish()
+
+
+def _reload_tools(_) -> None:
+    # `tools.plugins` pushed through Nacos is picked up by the next run.
+    tool_registry.reset()
+
+
+def _open_clients() -> None:
+    with startup_report.phase("clients"):
+        agent.bot.open()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.state.settings = app_settings
 
+    # Building the scheduler client imports `openai`; do it off the loop
+    # while the registration below waits on Nacos.
+    opening = asyncio.create_task(asyncio.to_thread(_open_clients))
+    shared_config = None
     try:
-        if nacos:
-            await nacos_manager.register()
-            app.state.nacos_manager = nacos_manager
-            yield
-            await nacos_manager.deregister()
-        else:
-            app.state.nacos_manager = None
-            yield
+        with startup_report.phase("registration"):
+            if is_worker():
+                # The supervisor owns the Nacos registration for this host.
+                shared_config = SharedConfig(SHARED_STATE_DIR)
+                shared_config.add_listener(_reload_tools)
+                await shared_config.start()
+                app.state.nacos_manager = shared_config
+            elif nacos:
+                nacos_manager.add_listener(_reload_tools)
+                await nacos_manager.register()
+                app.state.nacos_manager = nacos_manager
+                lifecycle.add_drain_hook(nacos_manager.deregister)
+            else:
+                app.state.nacos_manager = None
+        await opening
     except Exception as e:
         logger.critical(f"Startup failed: {str(e)}")
         raise
+
+    with startup_report.phase("health"):
+        if monitor_loop:
+            loop_monitor.start()
+        register_health_checks(app)
+        await health_monitor.start()
+    if image_pipeline is not None and not image_pipeline.resizes:
+        logger.warning("Pillow is not installed: chat images are cached but not resized")
+    with startup_report.phase("workers"):
+        agent.job_pool.start()
+        await usage_tracker.start()
+    # Warm up once the server is listening, so the startup and readiness
+    # probes can answer (503) until it is done.
+    warming = asyncio.create_task(warm_up())
+    try:
+        yield
     finally:
-        if nacos_manager:
-            await nacos_manager.deregister()
+        warming.cancel()
+        # No-op when the server already drained on SIGTERM.
+        await lifecycle.drain()
+        await agent.job_pool.stop()
+        await usage_tracker.stop()
+        if shared_config is not None:
+            await shared_config.stop()
+        agent.bot.close()
+        close_search_client()
+        if image_pipeline is not None:
+            image_pipeline.close()
+        if traffic_capture is not None:
+            traffic_capture.close()
+        await process_pool.close()
+        await health_monitor.stop()
+        await loop_monitor.stop()
 
 
 deploy_env = os.getenv("DEPLOY_ENV", "dev")
+# Off unless listed: `/debug` exposes internal state and the profilers.
+profiling_envs = [env for env in os.getenv("PROFILING_ENVS", "").split(",") if env]
+profiling_token = os.getenv("PROFILING_TOKEN")
 if deploy_env != "dev":
-    app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
+    app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan,
+                  default_response_class=codec.JSONResponse)
 else:
-    app = FastAPI(lifespan=lifespan)
+    app = FastAPI(lifespan=lifespan, default_response_class=codec.JSONResponse)
 
 
 app.add_middleware(
@@ -64,40 +175,79 @@ app.add_middleware(CorrelationIdMiddleware, generator=lambda: shortuuid.uuid())
 
 @app.get("/config")
 async def config():
-    if hasattr(app.state, "nacos_manager"):
+    if getattr(app.state, "nacos_manager", None) is not None:
         manager = app.state.nacos_manager
         data = {
             "registerd": manager._registered,
             "config": manager.current_config,
             "ip": manager.service_ip,
-            "port": manager.service_port,
+            "port": app_settings.app.port,
+            "pid": os.getpid(),
         }
-        return JSONResponse(content=data, status_code=200)
+        return codec.JSONResponse(content=data, status_code=200)
     else:
         data = {
             "registerd": "unkown",
             "config": "unkown",
             "ip": "unkown",
-            "port": manager.service_port,
+            "port": app_settings.app.port,
         }
 
-        return JSONResponse(content=data, status_code=500)
+        return codec.JSONResponse(content=data, status_code=500)
+
+
+def require_profiling(request: Request) -> None:
+    if deploy_env not in profiling_envs:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if profiling_token and request.headers.get("X-Profiling-Token") != profiling_token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+@app.get("/debug/startup", dependencies=[Depends(require_profiling)])
+async def debug_startup():
+    return startup_report.snapshot()
+
+
+@app.get("/debug/limiters", dependencies=[Depends(require_profiling)])
+async def debug_limiters():
+    return {name: limiter.snapshot() for name, limiter in all_limiters().items()}
+
+
+@app.get("/debug/loop", dependencies=[Depends(require_profiling)])
+async def debug_loop():
+    return loop_monitor.snapshot()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render())
+
+
+@app.post("/debug/profile/cpu", dependencies=[Depends(require_profiling)])
+async def profile_cpu(seconds: float = 10, interval_ms: float = 5):
+    try:
+        stacks = await profiling_service.profile_cpu(seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=str(e))
+    return PlainTextResponse(stacks)
+
+
+@app.post("/debug/profile/memory", dependencies=[Depends(require_profiling)])
+async def profile_memory(seconds: float = 10, top: int = 25):
+    try:
+        return await profiling_service.profile_memory(seconds, top)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=str(e))
 
 
 app.include_router(probes.router)
 app.include_router(agent.router)
 
+startup_report.record("import", _import_started)
+
 if __name__ == "__main__":
-    # log_config = uvicorn.config.LOGGING_CONFIG
-    # log_config["formatters"]["access"][
-    #     "fmt"
-    # ] = "%(asctime)s - %(levelname)s - %(message)s"
-    # log_config["formatters"]["default"][
-    #     "fmt"
-    # ] = "%(asctime)s - %(levelname)s - %(message)s"
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=nacos_manager.service_port,
-        log_level="debug",
-    )
+    from app.server import serve
+
+    serve()
@@ -1,69 +1,174 @@
-from typing import Dict
+import asyncio
+import os
+from typing import List, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 
-from app.core.logger import logger
-from app.services.jtai import JTAI, FunctionManager
-from app.services.tools import websearch_func
+from app.core import codec
+from app.core.jobs import JobQueue, JobWorkerPool, QueueFull
+from app.core.lifecycle import ServiceDraining, lifecycle
+from app.core.usage import BudgetExceeded, usage_tracker
+from app.services.agents import (AgentError, BatchCheckpoint, BatchRunner, WebSearchAgent,
+                                 parse_items, parse_jsonl)
+from app.services.jtai import JTAI
 
 router = APIRouter(
     prefix="/agent",
     tags=["Agents"],
 )
 
+SCHEDULER_BASE_URL = os.getenv(
+    "SCHEDULER_BASE_URL", "http://172.31.192.111:30518/scheduler/v3/")
+
 bot = JTAI(api_key="no_api_key",
-           base_url="http://172.31.192.111:30518/scheduler/v3/")
-
-
-@router.post("/websearch")
-async def web_search(query: str):
-    manager = FunctionManager()
-    manager.register(websearch_func)
-
-    messages = [
-        {
-            "role": "user",
-            "content": query
-        }
-    ]
-
-    tool_call_tracker: Dict[str, dict] = {}  # {tool_call_id: {name, args}}
-
-    rounds = 0
-
-    while True:
-        rounds += 1
-        if rounds > 5:
-            logger.error("Max rounds exceed")
-            break
-
-        response = bot.chat(messages=messages, tools=manager.get_tools())
-        logger.info(
-            f"--- ROUND: {rounds} --- messages: {messages}, response: {response}")
-
-        tool_calls = response.choices[0].message.tool_calls
-        if tool_calls:
-            for tool_call in tool_calls:
-                result = manager.execute_tool_call(tool_call.model_dump())
-                logger.info(f"Function Result: {result}")
-
-                messages.append({
-                    "role": "assistant",
-                    "content": None,
-                    "tool_calls": [{
-                        "id": tool_call.id,
-                        "function": {
-                            "name": tool_call.function.name,
-                            "arguments": tool_call.function.arguments,
-                        },
-                        "type": "function"
-                    }]
-                })
-
-                messages.append({
-                    "role": "tool",
-                    "content": str(result),
-                    "tool_call_id": tool_call.id
-                })
-        else:
-            return response.choices[0].message.content
+           base_url=SCHEDULER_BASE_URL)
+
+websearch_agent = WebSearchAgent(bot)
+
+job_pool = JobWorkerPool(JobQueue())
+
+
+async def _websearch_job(payload: dict):
+    return await websearch_agent.answer(
+        payload["query"], caller=payload.get("caller", "anonymous"))
+
+
+job_pool.register("websearch", _websearch_job)
+
+
+def caller_id(x_caller_id: Optional[str] = Header(None)) -> str:
+    return x_caller_id or "anonymous"
+
+
+async def agent_slot():
+    try:
+        async with lifecycle.track():
+            yield
+    except ServiceDraining:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service is shutting down",
+            headers={"Retry-After": "1"},
+        )
+
+
+@router.post("/websearch", dependencies=[Depends(agent_slot)])
+async def web_search(query: str, image_url: Optional[List[str]] = Query(None),
+                     caller: str = Depends(caller_id)):
+    try:
+        return await websearch_agent.answer(query, caller=caller, images=image_url)
+    except AgentError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=str(e),
+        )
+    except BudgetExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+        )
+
+
+async def _read_batch(request: Request):
+    """A JSON list (or `{"queries": [...]}`) body, otherwise one item per JSONL line."""
+    body = (await request.body()).decode("utf-8")
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "application/json":
+        payload = codec.loads(body)
+        if isinstance(payload, dict):
+            payload = payload.get("queries")
+        if not isinstance(payload, list):
+            raise ValueError("expected a list of queries")
+        return parse_items(payload)
+    return parse_jsonl(body)
+
+
+@router.post("/websearch/batch")
+async def web_search_batch(request: Request, concurrency: int = 4, checkpoint: Optional[str] = None,
+                           caller: str = Depends(caller_id)):
+    try:
+        items = await _read_batch(request)
+        store = BatchCheckpoint.named(checkpoint) if checkpoint else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+    if not lifecycle.accepting:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service is shutting down",
+            headers={"Retry-After": "1"},
+        )
+
+    runner = BatchRunner(websearch_agent, concurrency=concurrency,
+                         checkpoint=store, caller=caller)
+
+    async def stream():
+        # The batch counts as one in-flight loop so draining waits for it.
+        async with lifecycle.track():
+            async for result in runner.run(items):
+                yield codec.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(query: str, priority: int = 0, caller: str = Depends(caller_id)):
+    """Queue a websearch agent run and return its job id immediately."""
+    if not lifecycle.accepting:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service is shutting down",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await job_pool.submit(
+            "websearch", {"query": query, "caller": caller}, priority)
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Job queue is full: {e}",
+            headers={"Retry-After": "5"},
+        )
+
+
+async def _job_or_404(job_id: str) -> dict:
+    job = await job_pool.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Job not found or expired")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return await _job_or_404(job_id)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    await _job_or_404(job_id)
+    if not await job_pool.cancel(job_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Job already started")
+    return await job_pool.get(job_id)
+
+
+@router.get("/jobs/{job_id}/events")
+async def subscribe_job(job_id: str):
+    """Server-sent `status` events until the job finishes."""
+    await _job_or_404(job_id)
+
+    async def stream():
+        async for job in job_pool.subscribe(job_id):
+            yield f"event: status\ndata: {codec.dumps(job)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@router.get("/usage")
+async def usage(caller: Optional[str] = None):
+    """Token usage per caller over the budget window, as of the last flush."""
+    return await asyncio.to_thread(usage_tracker.report, caller)
@@ -1,6 +1,10 @@
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import APIRouter, HTTPException, status
+
+from app.core.health import health_monitor
+from app.core.lifecycle import lifecycle
+from app.core.warmup import warmup
 
 """
 # deployment.yaml
@@ -44,30 +48,30 @@ async def liveness():
 
 
 @router.get("/readiness")
-async def readiness(request: Request):
-    manager = request.app.state.nacos_manager
+async def readiness():
+    health = health_monitor.status
 
-    if not manager._registered:
+    if lifecycle.state != "ready" or health["status"] != "UP":
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail={
                 "status": "DOWN",
-                "component": "nacos",
-                "error": getattr(manager, "last_error", "Not registered"),
+                "lifecycle": lifecycle.state,
+                "warmup": warmup.status,
+                "components": health["components"],
             },
         )
 
-    return {"status": "UP", "components": {"nacos": "UP"}}
+    return {"status": "UP", "components": health["components"]}
 
 
 @router.get("/startup")
-async def startup(request: Request):
-    manager = request.app.state.nacos_manager
-
-    if not hasattr(manager, "current_config"):
+async def startup():
+    if lifecycle.state == "starting":
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail={
-                "status": "STARTING", "connfig_loaded": False}
+                "status": "STARTING", "connfig_loaded": False,
+                "warmup": warmup.status}
         )
 
     return {"status": "UP"}
@@ -0,0 +1,227 @@
+"""Process entry point.
+
+With `WORKERS=1` (the default) uvicorn serves the app in this process. With
+more workers this process becomes a supervisor: it binds the listening socket
+once, spawns the workers, performs the single Nacos registration for the host
+and publishes the registration state and config to the workers through a
+snapshot file in `SHARED_STATE_DIR`.
+
+On SIGTERM/SIGINT the app drains before uvicorn stops: readiness flips to
+DOWN, Nacos is deregistered, new agent loops are refused and in-flight ones
+get `DRAIN_GRACE_SECONDS` to finish. A second signal exits immediately.
+"""
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+from app.core import app_settings
+from app.core.lifecycle import DRAIN_GRACE_SECONDS
+from app.core.logger import logger
+from app.core.shared_state import write_config_snapshot
+
+nacos: bool = os.getenv("NACOS", "true").lower() == "true"
+WORKER_RESTART_MAX_DELAY = float(os.getenv("WORKER_RESTART_MAX_DELAY_SECONDS", 30))
+# A worker that ran at least this long is restarted without delay.
+WORKER_STABLE_SECONDS = 60.0
+
+
+def build_config(workers: int) -> uvicorn.Config:
+    return uvicorn.Config(
+        "app.main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", app_settings.app.port)),
+        workers=workers,
+        log_level=os.getenv("LOG_LEVEL", "info").lower(),
+    )
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that drains the app before it stops accepting."""
+
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _draining = False
+
+    async def serve(self, sockets=None) -> None:
+        self._loop = asyncio.get_running_loop()
+        await super().serve(sockets=sockets)
+
+    def handle_exit(self, sig, frame) -> None:
+        if self._draining or self._loop is None or not self.started:
+            super().handle_exit(sig, frame)
+            return
+
+        self._draining = True
+        # Signals interrupt whatever is running; keep its request context out.
+        self._loop.call_soon_threadsafe(
+            lambda: asyncio.ensure_future(self._drain(sig, frame)),
+            context=contextvars.Context())
+
+    async def _drain(self, sig, frame) -> None:
+        from app.core.lifecycle import lifecycle
+
+        try:
+            await lifecycle.drain()
+        finally:
+            super().handle_exit(sig, frame)
+
+
+def _run_worker(config: uvicorn.Config, sockets) -> None:
+    DrainingServer(config).run(sockets=sockets)
+
+
+class NacosPublisher:
+    """Owns the host's Nacos registration in a thread of the supervisor."""
+
+    def __init__(self, shared_dir: str):
+        self.shared_dir = shared_dir
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._thread = threading.Thread(
+            target=self._run, name="nacos-publisher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        loop = self._loop
+        if loop is not None and self._stopped is not None:
+            try:
+                loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass  # _main finished between the check and the call
+        self._thread.join(timeout=10)
+
+    def _publish(self, manager) -> None:
+        write_config_snapshot(self.shared_dir, {
+            "registered": manager._registered,
+            "config": manager.current_config,
+            "ip": manager.service_ip,
+        })
+
+    def _run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        from app.services import nacos_manager
+
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        nacos_manager.add_listener(self._publish)
+        try:
+            try:
+                await nacos_manager.register()
+            except Exception as e:
+                logger.critical(f"Nacos registration failed: {str(e)}")
+                write_config_snapshot(self.shared_dir, {
+                    "registered": False, "last_error": str(e)})
+                return
+
+            await self._stopped.wait()
+            await nacos_manager.deregister()
+        finally:
+            # asyncio.run closes the loop once this returns.
+            self._loop = None
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config):
+        self.config = config
+        self.shared_dir = os.getenv("SHARED_STATE_DIR") or tempfile.mkdtemp(
+            prefix=f"llm-agent-service-{config.port}-")
+        self.should_exit = threading.Event()
+        self.processes: List[multiprocessing.Process] = []
+        self._context = multiprocessing.get_context("spawn")
+        self._started: Dict[int, float] = {}
+        self._delays: Dict[int, float] = {}
+        self._restart_at: Dict[int, float] = {}
+
+    def _spawn(self, sockets) -> multiprocessing.Process:
+        process = self._context.Process(
+            target=_run_worker, kwargs={"config": self.config, "sockets": sockets})
+        process.start()
+        self._started[process.pid] = time.monotonic()
+        logger.info(f"Started worker [{process.pid}]")
+        return process
+
+    def _restart(self, index: int, sockets) -> None:
+        """Respawns a dead worker, backing off while it keeps crashing early."""
+        now = time.monotonic()
+        process = self.processes[index]
+        if index not in self._restart_at:
+            uptime = now - self._started.pop(process.pid, now)
+            if uptime >= WORKER_STABLE_SECONDS:
+                delay = 0.0
+            else:
+                delay = min(max(self._delays.get(index, 0.0) * 2, 1.0), WORKER_RESTART_MAX_DELAY)
+            self._delays[index] = delay
+            self._restart_at[index] = now + delay
+            logger.warning("Worker [{}] exited with {}, restarting in {:.0f}s",
+                           process.pid, process.exitcode, delay)
+        if now >= self._restart_at[index]:
+            del self._restart_at[index]
+            self.processes[index] = self._spawn(sockets)
+
+    def _handle_exit(self, sig, frame) -> None:
+        self.should_exit.set()
+
+    def run(self) -> None:
+        os.environ["APP_ROLE"] = "worker"
+        os.environ["SHARED_STATE_DIR"] = self.shared_dir
+        write_config_snapshot(self.shared_dir, {
+            "registered": not nacos, "config": {}})
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self._handle_exit)
+
+        sock = self.config.bind_socket()
+        self.processes = [self._spawn([sock])
+                          for _ in range(self.config.workers)]
+
+        publisher = NacosPublisher(self.shared_dir) if nacos else None
+        if publisher is not None:
+            publisher.start()
+
+        while not self.should_exit.wait(0.5):
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    self._restart(index, [sock])
+
+        # Signal the workers first so they are never orphaned; they flip
+        # readiness to DOWN and drain while the host deregisters.
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        if publisher is not None:
+            try:
+                publisher.stop()
+            except Exception as e:
+                logger.error("Nacos publisher stop failed: {}", e)
+
+        deadline = time.monotonic() + DRAIN_GRACE_SECONDS + 10
+        for process in self.processes:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+        sock.close()
+        logger.info("Supervisor stopped")
+
+
+def serve() -> None:
+    workers = int(os.getenv("WORKERS", 1))
+    config = build_config(workers)
+    if workers <= 1:
+        DrainingServer(config).run()
+    else:
+        Supervisor(config).run()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,13 @@
+from .batch import BatchCheckpoint, BatchItem, BatchRunner, parse_items, parse_jsonl
+from .websearch import AgentError, WebSearchAgent, execute_tool
+
+__ALL__ = [
+    "AgentError",
+    "WebSearchAgent",
+    "execute_tool",
+    "BatchCheckpoint",
+    "BatchItem",
+    "BatchRunner",
+    "parse_items",
+    "parse_jsonl",
+]
@@ -0,0 +1,222 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from app.core import codec
+from app.core.logger import logger
+from app.services.jtai import FunctionManager
+
+from .websearch import WebSearchAgent, execute_tool, normalize_query
+
+BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR", "data/checkpoints")
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 16))
+
+_CHECKPOINT_NAME = re.compile(r"[\w.-]{1,128}")
+
+
+@dataclass
+class BatchItem:
+    id: str
+    query: str
+
+
+def parse_items(records: Iterable[Any]) -> List[BatchItem]:
+    """Accept plain query strings or `{"id": ..., "query": ...}` objects."""
+    items = []
+    for index, record in enumerate(records):
+        if isinstance(record, str):
+            items.append(BatchItem(id=str(index), query=record))
+        elif isinstance(record, dict) and isinstance(record.get("query"), str):
+            items.append(BatchItem(
+                id=str(record.get("id", index)), query=record["query"]))
+        else:
+            raise ValueError(f"line {index + 1}: expected a query string or object")
+    return items
+
+
+def parse_jsonl(text: str) -> List[BatchItem]:
+    records = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(codec.loads(line))
+        except codec.JSONDecodeError as e:
+            raise ValueError(f"line {number}: {e.msg}") from e
+    return parse_items(records)
+
+
+class ToolCallMemo:
+    """Runs each distinct tool call once per batch and shares the result."""
+
+    def __init__(self):
+        self._results: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+
+    @staticmethod
+    def _key(tool_call: Dict) -> str:
+        function = tool_call["function"]
+        try:
+            arguments = codec.dumps(codec.loads(function["arguments"]), sort_keys=True)
+        except (TypeError, ValueError):
+            arguments = function["arguments"]
+        return f"{function['name']}:{arguments}"
+
+    async def __call__(self, manager: FunctionManager, tool_call: Dict) -> str:
+        key = self._key(tool_call)
+        future = self._results.get(key)
+        while future is not None:
+            self.hits += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this caller was cancelled, not the shared call
+            # The caller running it was cancelled (e.g. a discarded
+            # prefetch): run it again, or join whoever already does.
+            self.hits -= 1
+            future = self._results.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._results[key] = future
+        try:
+            result = await execute_tool(manager, tool_call)
+        except asyncio.CancelledError:
+            self._results.pop(key, None)
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._results.pop(key, None)
+            future.set_exception(e)
+            future.exception()  # retrieved; waiters re-raise it themselves
+            raise
+        future.set_result(result)
+        return result
+
+
+class BatchCheckpoint:
+    """Append-only JSONL of finished items, used to resume a batch."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def named(cls, name: str) -> "BatchCheckpoint":
+        if not _CHECKPOINT_NAME.fullmatch(name):
+            raise ValueError(f"invalid checkpoint name: {name!r}")
+        return cls(Path(BATCH_CHECKPOINT_DIR) / f"{name}.jsonl")
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        done = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        result = codec.loads(line)
+                    except codec.JSONDecodeError:
+                        continue  # torn write from a crash
+                    done[result["id"]] = result
+        except FileNotFoundError:
+            pass
+        return done
+
+    def append(self, result: Dict[str, Any]) -> None:
+        line = codec.dumps(result) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class BatchRunner:
+    """Runs the agent over a batch and yields results as they complete.
+
+    Identical queries (after whitespace/case normalization) run once and
+    identical tool calls are shared across the whole batch. Items already
+    present in the checkpoint with the same id and query are replayed
+    instead of re-run.
+    """
+
+    def __init__(
+        self,
+        agent: WebSearchAgent,
+        concurrency: int = 4,
+        checkpoint: Optional[BatchCheckpoint] = None,
+        caller: str = "anonymous",
+    ):
+        self.agent = agent
+        self.caller = caller
+        self.concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+        self.checkpoint = checkpoint
+
+    async def run(self, items: List[BatchItem]) -> AsyncIterator[Dict[str, Any]]:
+        checkpointed = self.checkpoint.load() if self.checkpoint else {}
+        # Ids alone may be list indexes: an entry only counts for the same query.
+        done = {item.id: checkpointed[item.id] for item in items
+                if item.id in checkpointed and normalize_query(
+                    checkpointed[item.id].get("query", "")) == normalize_query(item.query)}
+        for item in items:
+            if item.id in done:
+                yield dict(done[item.id], resumed=True)
+
+        groups: Dict[str, List[BatchItem]] = {}
+        for item in items:
+            if item.id not in done:
+                groups.setdefault(normalize_query(item.query), []).append(item)
+
+        memo = ToolCallMemo()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: asyncio.Queue = asyncio.Queue()
+        stats = {"total": len(items), "resumed": len(items) - sum(map(len, groups.values())),
+                 "ok": 0, "error": 0, "deduplicated": 0}
+
+        closing = False
+
+        async def run_group(members: List[BatchItem]) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    answer = await self.agent.run(
+                        members[0].query, caller=self.caller, tool_executor=memo)
+                    outcome = {"status": "ok", "answer": answer}
+                except asyncio.CancelledError:
+                    if closing:
+                        raise
+                    # Cancelled from below, not by us: still report every member.
+                    logger.error("batch item {} was cancelled", members[0].id)
+                    outcome = {"status": "error", "error": "cancelled"}
+                except Exception as e:
+                    logger.error("batch item {} failed: {}", members[0].id, e)
+                    outcome = {"status": "error", "error": str(e)}
+                elapsed = round((time.perf_counter() - start) * 1000, 1)
+
+            for index, member in enumerate(members):
+                result = {"id": member.id, "query": member.query,
+                          **outcome, "elapsed_ms": elapsed,
+                          "deduplicated": index > 0}
+                if outcome["status"] == "ok" and self.checkpoint is not None:
+                    self.checkpoint.append(result)
+                await results.put(result)
+
+        tasks = [asyncio.create_task(run_group(members))
+                 for members in groups.values()]
+        try:
+            for _ in range(sum(map(len, groups.values()))):
+                result = await results.get()
+                stats[result["status"]] += 1
+                stats["deduplicated"] += result["deduplicated"]
+                yield result
+        finally:
+            closing = True
+            for task in tasks:
+                task.cancel()
+
+        stats["tool_calls_shared"] = memo.hits
+        yield {"summary": stats}
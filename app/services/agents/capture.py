@@ -0,0 +1,175 @@
+import gzip
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core import codec
+from app.core.logger import logger
+from app.core.metrics import metrics
+
+from .prefetch import ToolExecutor
+
+AGENT_CAPTURE = os.getenv("AGENT_CAPTURE", "false").lower() == "true"
+AGENT_CAPTURE_PATH = os.getenv("AGENT_CAPTURE_PATH", "data/captures/websearch.jsonl.gz")
+AGENT_CAPTURE_SAMPLE = float(os.getenv("AGENT_CAPTURE_SAMPLE", 1.0))
+AGENT_CAPTURE_MAX_MB = float(os.getenv("AGENT_CAPTURE_MAX_MB", 512))
+
+CAPTURE_VERSION = 1
+
+_captured_total = metrics.counter(
+    "agent_captured_total", "Agent runs written to the capture file, by outcome", ["outcome"])
+
+# Personal data that must not reach the capture file. Replacements are
+# stable, so a redacted query still matches its redacted tool arguments.
+_REDACTIONS = [
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+    (re.compile(r"(?<!\d)\d{17}[\dXx](?!\d)"), "<id>"),
+    (re.compile(r"(?<!\d)(?:\+?86[- ]?)?1[3-9]\d{9}(?!\d)"), "<phone>"),
+]
+
+
+def redact(value: Any) -> Any:
+    if isinstance(value, str):
+        for pattern, replacement in _REDACTIONS:
+            value = pattern.sub(replacement, value)
+        return value
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def count_tool_results(messages: List[Dict]) -> int:
+    """Tool results already in the conversation: with the query, this
+    identifies an agent round in a capture."""
+    return sum(1 for message in messages if message.get("role") == "tool")
+
+
+class Recording:
+    """One agent run: its query, each completion and each tool call.
+
+    Offsets and durations are seconds from the start of the run. Requests
+    are summarized rather than copied: their messages are the query plus
+    the earlier responses and tool results, which are all in the recording.
+    """
+
+    def __init__(self, agent: str, query: str):
+        self.agent = agent
+        self.query = query
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.calls: List[Dict[str, Any]] = []
+
+    def _timing(self, started: float) -> Dict[str, float]:
+        now = time.perf_counter()
+        return {"offset": round(started - self._start, 4), "duration": round(now - started, 4)}
+
+    def chat(self, messages: List[Dict], options: Dict, response, started: float) -> None:
+        self.calls.append({
+            "kind": "chat",
+            **self._timing(started),
+            "request": {
+                "model": options.get("model"),
+                "messages": len(messages),
+                "tool_results": count_tool_results(messages),
+                "tools": [tool["function"]["name"] for tool in options.get("tools") or []],
+            },
+            "response": response,
+        })
+
+    def wrap(self, tool_executor: ToolExecutor) -> ToolExecutor:
+        """`tool_executor`, recording each call's arguments and result."""
+        async def execute(manager, tool_call: Dict) -> str:
+            started = time.perf_counter()
+            result = await tool_executor(manager, tool_call)
+            self.calls.append({
+                "kind": "tool",
+                **self._timing(started),
+                "name": tool_call["function"]["name"],
+                "arguments": tool_call["function"]["arguments"],
+                "result": result,
+            })
+            return result
+        return execute
+
+    def to_dict(self, answer: Optional[str], error: Optional[BaseException]) -> Dict[str, Any]:
+        return {
+            "version": CAPTURE_VERSION,
+            "agent": self.agent,
+            "started_at": round(self.started_at, 3),
+            "elapsed": round(time.perf_counter() - self._start, 4),
+            "query": self.query,
+            "answer": answer,
+            "error": type(error).__name__ if error is not None else None,
+            "calls": self.calls,
+        }
+
+
+class TrafficCapture:
+    """Appends sampled agent runs to a local capture file for replay.
+
+    Each run is one redacted JSON line. Callers, sessions and upstream ids
+    are never written. With a `.gz` path every line is its own gzip member,
+    so the file stays readable if the process stops mid-write. Writes happen
+    on a background thread, and stop once the file reaches `max_mb`.
+    """
+
+    def __init__(self, path: str = AGENT_CAPTURE_PATH, sample: float = AGENT_CAPTURE_SAMPLE,
+                 max_mb: float = AGENT_CAPTURE_MAX_MB):
+        self.path = Path(path)
+        self.sample = sample
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self, agent: str, query: str) -> Optional[Recording]:
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return None
+        return Recording(agent, query)
+
+    def save(self, recording: Recording, answer: Optional[str] = None,
+             error: Optional[BaseException] = None) -> None:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(1, thread_name_prefix="capture")
+        self._executor.submit(self._write, recording.to_dict(answer, error))
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+                _captured_total.inc(outcome="full")
+                return
+            line = codec.dumpb(redact(record)) + b"\n"
+            if self.path.suffix == ".gz":
+                line = gzip.compress(line)
+            with open(self.path, "ab") as f:
+                f.write(line)
+            _captured_total.inc(outcome="written")
+        except Exception as e:
+            _captured_total.inc(outcome="error")
+            logger.warning("agent capture write failed: {}", e)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def read_recordings(path: str) -> Iterator[Dict[str, Any]]:
+    """Recordings from a capture file, plain or gzipped."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield codec.loads(line)
+
+
+traffic_capture: Optional[TrafficCapture] = TrafficCapture() if AGENT_CAPTURE else None
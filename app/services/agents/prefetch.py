@@ -0,0 +1,69 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Dict, Tuple
+
+from app.core import codec
+from app.core.logger import logger
+from app.core.metrics import metrics
+from app.services.jtai import FunctionManager
+
+ToolExecutor = Callable[[FunctionManager, Dict], Awaitable[str]]
+
+_prefetch_total = metrics.counter(
+    "tool_prefetch_total",
+    "Tool calls started while the completion was still streaming, by outcome",
+    ["outcome"],
+)
+
+
+def _same_call(a: Dict, b: Dict) -> bool:
+    if a["function"]["name"] != b["function"]["name"]:
+        return False
+    try:
+        return codec.loads(a["function"]["arguments"]) == codec.loads(b["function"]["arguments"])
+    except ValueError:
+        return False
+
+
+class ToolPrefetcher:
+    """Starts tool calls announced by a streaming completion before it ends.
+
+    `on_tool_call` is handed to `JTAI.chat_streamed` and runs in its thread;
+    the tool starts on the event loop in the caller's context (trace and
+    correlation id). Once the completion is final, `result()` reuses the
+    early run only if the final call has the same name and arguments, and
+    cancels it otherwise.
+    """
+
+    def __init__(self, manager: FunctionManager, tool_executor: ToolExecutor):
+        self.manager = manager
+        self.tool_executor = tool_executor
+        self._loop = asyncio.get_running_loop()
+        self._context = contextvars.copy_context()
+        self._started: Dict[int, Tuple[Dict, asyncio.Task]] = {}
+
+    def on_tool_call(self, index: int, tool_call: Dict) -> None:
+        self._loop.call_soon_threadsafe(
+            self._start, index, tool_call, context=self._context)
+
+    def _start(self, index: int, tool_call: Dict) -> None:
+        logger.debug("prefetching tool call {} {}", index, tool_call["function"]["name"])
+        task = asyncio.ensure_future(self.tool_executor(self.manager, tool_call))
+        self._started[index] = (tool_call, task)
+
+    async def result(self, index: int, tool_call: Dict) -> str:
+        started = self._started.pop(index, None)
+        if started is not None:
+            early_call, task = started
+            if _same_call(early_call, tool_call):
+                _prefetch_total.inc(outcome="hit")
+                return await task
+            task.cancel()
+            _prefetch_total.inc(outcome="miss")
+        return await self.tool_executor(self.manager, tool_call)
+
+    def discard(self) -> None:
+        for _, task in self._started.values():
+            task.cancel()
+            _prefetch_total.inc(outcome="discarded")
+        self._started.clear()
@@ -0,0 +1,265 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.logger import clip, logger, sampled
+from app.core.settings import app_settings
+from app.core.singleflight import SingleFlight
+from app.core.tracing import tracer
+from app.core.usage import BudgetExceeded, RunUsage, token_budget, usage_tracker
+from app.services.jtai import JTAI, FunctionManager, canonical_json
+from app.services.jtai.jtai import format_chat_message
+from app.services.tools import tool_registry
+
+from .capture import Recording, traffic_capture
+from .prefetch import ToolExecutor, ToolPrefetcher
+
+AGENT_PREFETCH = os.getenv("AGENT_PREFETCH", "true").lower() == "true"
+AGENT_COALESCE = os.getenv("AGENT_COALESCE", "true").lower() == "true"
+AGENT_REUSE_SECONDS = float(os.getenv("AGENT_REUSE_SECONDS", 0))
+
+
+class AgentError(Exception):
+    pass
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).lower()
+
+
+async def execute_tool(manager: FunctionManager, tool_call: Dict) -> str:
+    return await manager.run_tool_call(tool_call)
+
+
+class WebSearchAgent:
+    """Multi-round tool-calling loop behind `/agent/websearch`.
+
+    The blocking JTAI calls run in worker threads, and tools run where their
+    `mode` says, so concurrent agent loops do not stall the event loop. With
+    `prefetch` the completion is streamed and each tool call starts as soon
+    as its arguments are complete, overlapping the rest of the generation.
+    """
+
+    name = "websearch"
+
+    def __init__(self, bot: JTAI, max_rounds: int = 5, prefetch: bool = AGENT_PREFETCH,
+                 coalesce: bool = AGENT_COALESCE, reuse_window: float = AGENT_REUSE_SECONDS):
+        self.bot = bot
+        self.max_rounds = max_rounds
+        self.prefetch = prefetch
+        self.coalesce = coalesce
+        # Shared results are (answer, usage); a run without an answer is not reused.
+        self._flights = SingleFlight(self.name, reuse_window,
+                                     reusable=lambda result: result[0] is not None)
+
+    def _manager(self) -> FunctionManager:
+        # Resolved per run so tool changes pushed through Nacos apply.
+        manager = FunctionManager()
+        for func in tool_registry.for_agent(self.name):
+            manager.register(func)
+        return manager
+
+    def _flight_key(self, query: str, images: Optional[List[str]] = None) -> str:
+        return canonical_json([
+            normalize_query(query),
+            images or [],
+            sorted(func.name for func in tool_registry.for_agent(self.name)),
+            app_settings.get(f"agents.{self.name}.system_prompt"),
+        ])
+
+    async def warm(self, completion: bool = False) -> None:
+        """Prepares this agent's tools (schemas, caches, connections). With
+        `completion`, also sends a one-token request with the agent's system
+        prompt and tools, so the scheduler has the shared prefix cached."""
+        manager = self._manager()
+        await asyncio.gather(*(func.warm() for func in manager.functions.values()))
+        if completion:
+            response = await asyncio.to_thread(
+                self.bot.chat,
+                messages=[{"role": "user", "content": "hi"}],
+                max_tokens=1,
+                tools=manager.get_tools(),
+                system_prompt=app_settings.get(f"agents.{self.name}.system_prompt"),
+                user="warmup",
+                # Not traffic: keep it out of the scheduler limiter's baseline.
+                observe=False,
+            )
+            if response is None:
+                raise AgentError("warm-up completion failed")
+
+    async def answer(self, query: str, *, caller: str = "anonymous",
+                     images: Optional[List[str]] = None) -> Optional[str]:
+        """Entry point for user traffic: identical concurrent queries (same
+        normalized text and agent config) share one run and its answer.
+        Every caller served by a shared run is charged its usage. A leader
+        that runs out of budget does not fail the callers that joined it:
+        they run again on their own budget."""
+        if not self.coalesce:
+            return await self.run(query, caller=caller, images=images)
+        if token_budget.check(RunUsage(caller)) == "stop":
+            raise BudgetExceeded(f"token budget of caller {caller} is used up")
+
+        led = False
+
+        def lead():
+            nonlocal led
+            led = True
+            return self._run_shared(query, caller, images)
+
+        try:
+            answer, usage = await self._flights.do(self._flight_key(query, images), lead)
+        except BudgetExceeded:
+            if led:
+                raise
+            return await self.run(query, caller=caller, images=images)
+        if not led:
+            usage_tracker.charge(caller, usage)
+        return answer
+
+    async def _run_shared(self, query: str, caller: str,
+                          images: Optional[List[str]]) -> Tuple[Optional[str], RunUsage]:
+        usage = RunUsage(caller)
+        answer = await self.run(query, caller=caller, images=images, usage=usage)
+        return answer, usage
+
+    async def run(self, query: str, *, caller: str = "anonymous",
+                  tool_executor: ToolExecutor = execute_tool,
+                  images: Optional[List[str]] = None,
+                  usage: Optional[RunUsage] = None) -> Optional[str]:
+        if usage is None:
+            usage = RunUsage(caller)
+        if token_budget.check(usage) == "stop":
+            raise BudgetExceeded(f"token budget of caller {caller} is used up")
+
+        manager = self._manager()
+        tools = manager.get_tools()
+        # One session per run: every round extends the same upstream context.
+        options = {
+            "tools": tools,
+            "session_id": self.bot.create_converstaion(),
+            "system_prompt": app_settings.get(f"agents.{self.name}.system_prompt"),
+            "user": caller,
+        }
+
+        # Image URLs become `image_url` parts; JTAI runs them through the
+        # image pipeline on every round.
+        messages = [format_chat_message("user", query, image_urls=images)]
+
+        recording = traffic_capture.start(self.name, query) if traffic_capture else None
+        if recording is not None:
+            tool_executor = recording.wrap(tool_executor)
+
+        with tracer.start_span("agent.websearch", query_length=len(query)) as span:
+            answer, error = None, None
+            try:
+                answer = await self._loop(messages, manager, options, usage, tool_executor,
+                                          span, recording)
+                return answer
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                span.set_attributes(usage.to_dict())
+                logger.info("agent usage caller={} prompt={} completion={} tool_calls={}",
+                            caller, usage.prompt_tokens, usage.completion_tokens, usage.tool_calls)
+                if recording is not None:
+                    traffic_capture.save(recording, answer, error)
+
+    async def _loop(self, messages, manager: FunctionManager, options: Dict,
+                    usage: RunUsage, tool_executor: ToolExecutor, span,
+                    recording: Optional[Recording] = None) -> Optional[str]:
+        rounds = 0
+        while True:
+            rounds += 1
+            span.set_attribute("rounds", rounds)
+            if rounds > self.max_rounds:
+                logger.error("Max rounds exceed")
+                span.record_error("max rounds exceeded")
+                return None
+            self._apply_budget(usage, options)
+
+            with tracer.start_span("agent.round", round=rounds):
+                prefetcher = ToolPrefetcher(manager, tool_executor)
+                try:
+                    started = time.perf_counter()
+                    response = await self._complete(messages, options, prefetcher, rounds)
+                    if recording is not None:
+                        recording.chat(messages, options, response, started)
+                    if response is None:
+                        span.record_error("completion failed")
+                        raise AgentError("LLM scheduler unavailable")
+                    _account(usage, messages, response)
+
+                    tool_calls = response.choices[0].message.tool_calls
+                    logger.info("agent round {} messages={} tool_calls={}",
+                                rounds, len(messages), len(tool_calls or []))
+                    if sampled():
+                        logger.debug("agent round {} response: {}",
+                                     rounds, clip(response))
+                    if not tool_calls:
+                        return response.choices[0].message.content
+
+                    for index, tool_call in enumerate(tool_calls):
+                        result = await prefetcher.result(index, tool_call.model_dump())
+                        logger.debug("function {} result: {}",
+                                     tool_call.function.name, clip(result))
+
+                        messages.append({
+                            "role": "assistant",
+                            "content": None,
+                            "tool_calls": [{
+                                "id": tool_call.id,
+                                "function": {
+                                    "name": tool_call.function.name,
+                                    "arguments": tool_call.function.arguments,
+                                },
+                                "type": "function"
+                            }]
+                        })
+
+                        messages.append({
+                            "role": "tool",
+                            "content": str(result),
+                            "tool_call_id": tool_call.id
+                        })
+                finally:
+                    prefetcher.discard()
+
+    def _apply_budget(self, usage: RunUsage, options: Dict) -> None:
+        decision = token_budget.check(usage)
+        if decision == "stop":
+            raise BudgetExceeded(
+                f"token budget used up after {usage.total_tokens} tokens (caller {usage.caller})")
+        if decision == "downgrade" and options.get("model") != token_budget.fallback_model:
+            logger.warning("token budget nearly used up, downgrading caller {} to {}",
+                           usage.caller, token_budget.fallback_model)
+            options["model"] = token_budget.fallback_model
+
+    async def _complete(self, messages, options: Dict, prefetcher: ToolPrefetcher,
+                        rounds: int):
+        # Later rounds go first when the scheduler is saturated: they are
+        # closer to an answer and already paid for the earlier rounds.
+        if self.prefetch:
+            return await self.bot.achat_streamed(
+                priority=rounds, messages=messages,
+                on_tool_call=prefetcher.on_tool_call, **options)
+        return await self.bot.achat(priority=rounds, messages=messages, **options)
+
+
+def _estimate_tokens(value) -> int:
+    # Roughly 4 bytes per token for English and about 1 per CJK character.
+    return len(str(value).encode("utf-8")) // 4
+
+
+def _account(usage: RunUsage, messages, response) -> None:
+    message = response.choices[0].message
+    tool_calls = len(message.tool_calls or [])
+    if response.usage is not None:
+        prompt, completion = response.usage.prompt_tokens, response.usage.completion_tokens
+    else:
+        # Streams from schedulers without `include_usage` report nothing.
+        prompt = _estimate_tokens(messages)
+        completion = _estimate_tokens(message.content or "") + sum(
+            _estimate_tokens(call.function.arguments) for call in message.tool_calls or [])
+    usage_tracker.record(usage, prompt, completion, tool_calls)
@@ -1,5 +1,5 @@
 from .chat_context import ChatContent, ChatContext, ChatMessage, ChatRole
-from .jtai import JTAI
+from .jtai import JTAI, canonical_json
 from .tool_context import Function, FunctionManager, FunctionParameter, FunctionResponse
 
 __ALL__ = [
@@ -12,4 +12,5 @@ __ALL__ = [
     "FunctionResponse",
     "ChatContent",
     "JTAI",
+    "canonical_json",
 ]
@@ -0,0 +1,275 @@
+import base64
+import binascii
+import hashlib
+import importlib.util
+import io
+import ipaddress
+import os
+import socket
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.cache import get_cache
+from app.core.logger import logger
+from app.core.metrics import metrics
+
+# Resizing needs Pillow (a dependency, but the rest of the pipeline works
+# without it). Imported on first use, it is not small.
+_has_pillow = importlib.util.find_spec("PIL") is not None
+
+IMAGE_PIPELINE = os.getenv("IMAGE_PIPELINE", "true").lower() == "true"
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 1024))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 85))
+IMAGE_MAX_FETCH_MB = float(os.getenv("IMAGE_MAX_FETCH_MB", 20))
+IMAGE_FETCH_TIMEOUT_SECONDS = float(os.getenv("IMAGE_FETCH_TIMEOUT_SECONDS", 10))
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", 256))
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", 3600))
+IMAGE_FETCH_MAX_REDIRECTS = 5
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+_images_total = metrics.counter(
+    "image_pipeline_total", "Chat message images by outcome", ["outcome"])
+_image_bytes_total = metrics.counter(
+    "image_pipeline_bytes_total", "Image bytes before and after the pipeline", ["stage"])
+
+
+class ImageError(Exception):
+    pass
+
+
+def _digest(value: str | bytes) -> str:
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return hashlib.sha256(value).hexdigest()[:32]
+
+
+def _decode_data_url(url: str) -> bytes:
+    header, _, data = url.partition(",")
+    if not header.endswith(";base64"):
+        raise ImageError("only base64 data URLs are supported")
+    try:
+        return base64.b64decode(data, validate=True)
+    except binascii.Error as e:
+        raise ImageError(f"invalid base64 image: {e}") from None
+
+
+def _sniff_mime(data: bytes) -> str:
+    for signature, mime in _SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    raise ImageError("unrecognised image format")
+
+
+def _check_address(address: str) -> None:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    if not ip.is_global or ip.is_multicast:
+        raise ImageError(f"image host resolves to non-public address {ip}")
+
+
+def _check_url(url: httpx.URL) -> None:
+    """Callers choose image URLs: refuse any that would reach loopback,
+    private, link-local or otherwise internal addresses."""
+    if url.scheme not in ("http", "https"):
+        raise ImageError("unsupported image URL scheme")
+    try:
+        infos = socket.getaddrinfo(url.host, url.port or (443 if url.scheme == "https" else 80),
+                                   type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ImageError(f"cannot resolve image host {url.host}: {e}") from None
+    for info in infos:
+        _check_address(info[4][0])
+
+
+def _check_peer(response: httpx.Response) -> None:
+    """Checks the address actually connected to, so a DNS answer that
+    changed since `_check_url` can't reach an internal host."""
+    stream = response.extensions.get("network_stream")
+    peer = stream.get_extra_info("server_addr") if stream is not None else None
+    if peer is not None:
+        _check_address(peer[0])
+
+
+class ImagePipeline:
+    """Turns `image_url` parts into small, stable data URLs.
+
+    Each image is fetched (or decoded) once. It is downscaled to fit
+    `max_side` and re-encoded as JPEG, and cached by content hash, so the
+    same picture sent by URL or inline gives the same bytes. Later rounds of
+    a conversation re-send exactly those bytes and look them up by a hash of
+    the URL alone. Concurrent requests for one image share the work.
+    Without Pillow all of that still happens; only the resizing is skipped.
+    """
+
+    def __init__(self, max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_QUALITY,
+                 max_fetch_bytes: int = int(IMAGE_MAX_FETCH_MB * 1024 * 1024),
+                 fetch_timeout: float = IMAGE_FETCH_TIMEOUT_SECONDS):
+        self.max_side = max_side
+        self.quality = quality
+        self.max_fetch_bytes = max_fetch_bytes
+        self.fetch_timeout = fetch_timeout
+        self._cache_store = None
+        self._client: Optional[httpx.Client] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def resizes(self) -> bool:
+        return _has_pillow
+
+    @property
+    def _cache(self):
+        if self._cache_store is None:
+            self._cache_store = get_cache(
+                "images", maxsize=IMAGE_CACHE_SIZE, ttl=IMAGE_CACHE_TTL_SECONDS)
+        return self._cache_store
+
+    def prepare(self, url: str) -> str:
+        """The data URL to send for `url`; `url` itself if it can't be
+        processed."""
+        key = "url:" + _digest(url)
+        cached = self._cache.get(key)
+        if cached is not None:
+            _images_total.inc(outcome="hit")
+            return cached
+
+        with self._lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._prepare(url)
+            self._cache.set(key, result)
+            # The next round sends the result itself: make that a hit too.
+            self._cache.set("url:" + _digest(result), result)
+        except Exception as e:
+            _images_total.inc(outcome="error")
+            logger.warning("image pipeline skipped {}: {}", url[:80], e)
+            result = url
+        finally:
+            with self._lock:
+                del self._pending[key]
+        future.set_result(result)
+        return result
+
+    def _prepare(self, url: str) -> str:
+        data = self._load(url)
+        key = "image:" + _digest(data)
+        cached = self._cache.get(key)
+        if cached is not None:
+            _images_total.inc(outcome="duplicate")
+            return cached
+        encoded, mime = self._shrink(data)
+        result = f"data:{mime};base64,{base64.b64encode(encoded).decode('ascii')}"
+        self._cache.set(key, result)
+        _images_total.inc(outcome="processed")
+        _image_bytes_total.inc(len(data), stage="in")
+        _image_bytes_total.inc(len(encoded), stage="out")
+        return result
+
+    def _load(self, url: str) -> bytes:
+        if url.startswith("data:"):
+            return _decode_data_url(url)
+        target = httpx.URL(url)
+        for _ in range(IMAGE_FETCH_MAX_REDIRECTS + 1):
+            # Every hop is checked: a public URL may redirect inwards.
+            _check_url(target)
+            with self._get_client().stream("GET", target, timeout=self.fetch_timeout) as response:
+                _check_peer(response)
+                if response.next_request is not None:
+                    target = response.next_request.url
+                    continue
+                response.raise_for_status()
+                return self._read(response)
+        raise ImageError(f"more than {IMAGE_FETCH_MAX_REDIRECTS} redirects")
+
+    def _read(self, response: httpx.Response) -> bytes:
+        chunks: List[bytes] = []
+        size = 0
+        for chunk in response.iter_bytes():
+            size += len(chunk)
+            if size > self.max_fetch_bytes:
+                raise ImageError(f"image larger than {self.max_fetch_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _shrink(self, data: bytes) -> Tuple[bytes, str]:
+        if not self.resizes:
+            return data, _sniff_mime(data)
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(data)) as image:
+            original_mime = Image.MIME.get(image.format or "")
+            # JPEG can decode straight at a reduced scale.
+            image.draft("RGB", (self.max_side, self.max_side))
+            image = ImageOps.exif_transpose(image)
+            fits = max(image.size) <= self.max_side
+            if original_mime == "image/jpeg" and fits:
+                return data, original_mime
+            image.thumbnail((self.max_side, self.max_side))
+            if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+                background = Image.new("RGB", image.size, "white")
+                background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=self.quality, optimize=True)
+        if fits and original_mime and len(data) <= buffer.tell():
+            # Small already, and JPEG would not make it smaller.
+            return data, original_mime
+        return buffer.getvalue(), "image/jpeg"
+
+    def _get_client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # Redirects are followed by `_load`, which checks each
+                    # hop; no proxy, so `_check_peer` sees the real host.
+                    self._client = httpx.Client(follow_redirects=False, trust_env=False)
+        return self._client
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def prepare_images(messages: List[Dict]) -> List[Dict]:
+    """`messages` with every `image_url` part run through the pipeline.
+    Messages without images are returned as they are."""
+    if image_pipeline is None:
+        return messages
+    prepared = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list) and any(
+                isinstance(part, dict) and part.get("type") == "image_url" for part in content):
+            message = {**message, "content": [
+                {**part, "image_url": {**part["image_url"],
+                                       "url": image_pipeline.prepare(part["image_url"]["url"])}}
+                if isinstance(part, dict) and part.get("type") == "image_url" else part
+                for part in content
+            ]}
+        prepared.append(message)
+    return prepared
+
+
+image_pipeline: Optional[ImagePipeline] = ImagePipeline() if IMAGE_PIPELINE else None
@@ -1,21 +1,82 @@
-import json
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, Generator, List, Literal, Optional
+from typing import TYPE_CHECKING, Any, Dict, Generator, List, Literal, Optional
 from uuid import uuid4
 
-from openai import APIConnectionError, APIError, OpenAI, RateLimitError
+import httpx
 from typing_extensions import NotRequired, Required, TypedDict, TypeGuard
 
+from app.core import codec
+from app.core.circuit import get_breaker
+from app.core.limiter import LimiterTimeout, get_limiter
 from app.core.logger import logger
+from app.core.tracing import propagation_headers, tracer
 
 from .chat_context import ChatContent, ChatMessage, ChatRole
+from .images import prepare_images
 from .models import ChatModels
-from .types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, NotGivenOr
+from .streaming import StreamAccumulator, ToolCallReady
+from .types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, NotGivenOr, is_given
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+SCHEDULER_CACHE_HINTS = os.getenv(
+    "SCHEDULER_CACHE_HINTS", "true").lower() == "true"
+SCHEDULER_STREAM_USAGE = os.getenv(
+    "SCHEDULER_STREAM_USAGE", "true").lower() == "true"
+SCHEDULER_LIMITER = os.getenv(
+    "SCHEDULER_LIMITER", "true").lower() == "true"
+
+
+def canonical_json(value: Any) -> str:
+    """Byte-stable JSON: sorted keys, no insignificant whitespace."""
+    return codec.dumps(value, sort_keys=True)
+
+
+def _codec_http_client() -> httpx.Client:
+    """The SDK's default httpx client, encoding JSON bodies with `codec`.
+
+    Every SDK version hands the body to `httpx.Client.build_request` as
+    `json=`, which httpx encodes with the stdlib; `body=` on `post` is the
+    only payload argument they all accept, so this is where the codec fits.
+    """
+    from openai import DefaultHttpxClient
+
+    class CodecHttpxClient(DefaultHttpxClient):
+        def build_request(self, method, url, *, content=None, json=None, **kwargs):
+            if json is not None and content is None:
+                content, json = codec.dumpb(json), None
+                headers = httpx.Headers(kwargs.pop("headers", None))
+                headers.setdefault("Content-Type", "application/json")
+                kwargs["headers"] = headers
+            return super().build_request(method, url, content=content, json=json, **kwargs)
+
+    return CodecHttpxClient()
+
+
+def sort_tools(tools: Optional[List[Dict]]) -> Optional[List[Dict]]:
+    if not tools:
+        return tools
+    return sorted(tools, key=lambda tool: tool["function"]["name"])
+
+
+def prefix_key(model: str, system_prompt: Optional[str], tools: Optional[List[Dict]]) -> str:
+    """Identifies the part of every request that is shared across sessions."""
+    digest = hashlib.sha256(canonical_json(
+        [model, system_prompt, tools or []]).encode("utf-8"))
+    return digest.hexdigest()[:32]
 
 
 @dataclass
 class _ModelOptions:
     model: str | ChatModels
+    system_prompt: NotGivenOr[str]
     user: NotGivenOr[str]
     temperature: NotGivenOr[float]
     parallel_tool_calls: NotGivenOr[bool]
@@ -28,6 +89,7 @@ class JTAI:
                  api_key: NotGivenOr[str] = NOT_GIVEN,
                  base_url: NotGivenOr[str] = NOT_GIVEN,
                  model: str | ChatModels = "jiutian-lan-comv3",
+                 system_prompt: NotGivenOr[str] = NOT_GIVEN,
                  user: NotGivenOr[str] = NOT_GIVEN,
                  temperature: NotGivenOr[float] = NOT_GIVEN,
                  parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
@@ -36,17 +98,89 @@ class JTAI:
 
         self._opts = _ModelOptions(
             model=model,
+            system_prompt=system_prompt,
             user=user,
             temperature=temperature,
             parallel_tool_calls=parallel_tool_calls,
             metadata=metadata,
         )
 
-        self._client = OpenAI(api_key=api_key, base_url=base_url)
+        # `openai` takes about a second to import, so the client is built on
+        # `open()` (called from the app lifespan) or on first use.
+        self._api_key = api_key
+        self._base_url = base_url
+        self._client: Optional["OpenAI"] = None
+        self._http = None
+        self._client_lock = threading.Lock()
+        self._breaker = get_breaker("scheduler")
+        self._limiter = get_limiter("scheduler")
+
+    def open(self) -> "OpenAI":
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
 
+                    # Kept so `warm` can open connections in the same pool.
+                    self._http = _codec_http_client()
+                    self._client = OpenAI(api_key=self._api_key,
+                                          base_url=self._base_url,
+                                          http_client=self._http)
+        return self._client
+
+    def warm(self, connections: int = 1) -> None:
+        """Builds the client and the response validators, and opens up to
+        `connections` keep-alive connections to the scheduler."""
+        client = self.open()
+        from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+        # openai defers building pydantic validators until first use.
+        ChatCompletion.model_rebuild()
+        ChatCompletionChunk.model_rebuild()
+
+        def connect(_) -> None:
+            # Any response leaves a pooled connection behind.
+            try:
+                self._http.head(str(client.base_url), timeout=3.0)
+            except Exception as e:
+                logger.warning("scheduler warm-up connection failed: {}", e)
+
+        if connections > 0:
+            with ThreadPoolExecutor(connections) as executor:
+                list(executor.map(connect, range(connections)))
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    @staticmethod
     def create_converstaion() -> str:
         return str(uuid4()).replace("-", "")
 
+    def _prepare_messages(self, messages: List[ChatMessage], system_prompt: Optional[str]) -> List[ChatMessage]:
+        """Puts the system prompt first, exactly once, so every round of a
+        session starts with the same bytes. Images go through the image
+        pipeline, which also gives them the same bytes every round."""
+        messages = prepare_images(messages)
+        if system_prompt is None:
+            return messages
+        rest = [m for m in messages if m.get("role") != "system"]
+        return [{"role": "system", "content": system_prompt}] + rest
+
+    def _extra_body(self, session_id: Optional[str], prefix: str) -> Dict[str, Any]:
+        extra_body = {
+            "recordId": session_id or self.create_converstaion(),
+            "sourceType": "playground",
+            "auditSwitch": False,
+        }
+        if SCHEDULER_CACHE_HINTS:
+            # Requests sharing a session extend the same context; requests
+            # sharing a prefix key start with the same system prompt and tools.
+            extra_body["sessionId"] = extra_body["recordId"]
+            extra_body["prefixCacheKey"] = prefix
+        return extra_body
+
     def chat(self,
              *,
              messages: List[ChatMessage],
@@ -59,84 +193,223 @@ class JTAI:
              tools: Optional[List[str]] = None,
              tool_choice: Optional[List[str]] = "auto",
              response_format: Optional[List[str]] = None,
+             system_prompt: Optional[str] = None,
+             session_id: Optional[str] = None,
+             user: Optional[str] = None,
+             observe: bool = True,
              ) -> Generator[ChatMessage, None, None] | str:
 
-        extra_body = {
-            "recordId": "123",
-            "sourceType": "playground",
-            "auditSwitch": False,
-        }
-
         model = model if model is not None else self._opts.model
+        if system_prompt is None and is_given(self._opts.system_prompt):
+            system_prompt = self._opts.system_prompt
+        messages = self._prepare_messages(messages, system_prompt)
+        tools = sort_tools(tools)
+        extra_body = self._extra_body(
+            session_id, prefix_key(model, system_prompt, tools))
+        if user is None:
+            user = self._opts.user if is_given(self._opts.user) else "user"
+        stream_kwargs = {"stream_options": {"include_usage": True}} if stream and SCHEDULER_STREAM_USAGE else {}
+        from openai import APIConnectionError, APIError, RateLimitError
 
-        try:
-            response = self._client.chat.completions.create(
-                model=model,
-                messages=messages,
-                # response_format={ "type": "json_object" },
-                temperature=temperature,
-                max_tokens=max_tokens,
-                top_p=top_p,
-                extra_body=extra_body,
-                user="user",
-                stream=stream,
-                tools=tools,
-                tool_choice=tool_choice,
-            )
+        with tracer.start_span("jtai.chat",
+                               model=model,
+                               stream=stream,
+                               messages=len(messages),
+                               tools=len(tools or [])) as span:
+            if not self._breaker.allow():
+                logger.warning("scheduler circuit open, skipping completion")
+                span.record_error("circuit open")
+                return None
+
+            try:
+                response = self._create({
+                    "model": model,
+                    "messages": messages,
+                    # "response_format": { "type": "json_object" },
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "top_p": top_p,
+                    "user": user,
+                    "stream": stream,
+                    **stream_kwargs,
+                    "tools": tools,
+                    "tool_choice": tool_choice,
+                    **extra_body,
+                }, stream)
+
+                self._breaker.record_success()
+                if not stream:
+                    # No latency: a whole completion takes as long as its
+                    # output, which says little about load. Streams report
+                    # their time to first token instead.
+                    if observe:
+                        self._limiter.observe("success")
+                    _record_response(span, response)
+                return response
+                # if stream:
+                #     role: Any = None
+                #     for chunk in response:
+                #         LOGGER.debug(f"--- {chunk}")
+                #         if not chunk.choices:
+                #             continue
+                #         delta = chunk.choices[0].delta
+                #         if delta is None:
+                #             continue
+
+                #         role = delta.role if delta.role is not None else role
+                #         content = delta.content if delta.content is not None else ""
+                #         if content is None:
+                #             continue
+
+                #         yield format_chat_message(role, content)
+                # else:
+                #     print(f"--- {response}")
+                #     message = response.choices[0].message
+                #     if message is None:
+                #         raise Exception("Empty response")
+                #     response: ChatMessage = format_chat_message(
+                #         role=(message.role if message.role is not None else "assistant"),
+                #         message=(
+                #             message.content if message.content is not None else ""),
+                #     )
+
+                #     if message.tool_calls is not None and len(message.tool_calls) > 0:
+                #         response["role"] = "function"
+                #         response["content"] = json.dumps(
+                #             [
+                #                 {
+                #                     "id": t.id,
+                #                     "name": t.function.name,
+                #                     "arguments": json.loads(t.function.arguments),
+                #                 }
+                #                 for t in message.tool_calls
+                #             ],
+                #         )
+                #     yield response
+
+            except APIConnectionError as e:
+                logger.error("APIConnectionError: {}", e)
+                span.record_error(e)
+                self._breaker.record_failure()
+                if observe:
+                    self._limiter.observe("overload")
+                return None
+
+            except RateLimitError as e:
+                logger.error("RateLimitError: {}", e)
+                span.record_error(e)
+                if observe:
+                    self._limiter.observe("overload")
+                return None
+
+            except APIError as e:
+                logger.error("APIError: {}", e)
+                span.record_error(e)
+                if getattr(e, "status_code", 500) >= 500:
+                    self._breaker.record_failure()
+                    if observe:
+                        self._limiter.observe("overload")
+                return None
+
+    def _create(self, body: Dict[str, Any], stream: bool):
+        """Posts a chat completion request as is.
+
+        This is what `chat.completions.create` sends, but the SDK walks the
+        whole body through its parameter transforms on every call; the
+        messages grow with every tool result, so that cost grows with the
+        conversation. The body is then encoded by `codec`, in the client
+        built by `_codec_http_client`.
+        """
+        from openai import Stream
+        from openai.types.chat import ChatCompletion, ChatCompletionChunk
 
+        return self.open().post(
+            "/chat/completions",
+            cast_to=ChatCompletion,
+            body=body,
+            options={"headers": propagation_headers()},
+            stream=stream,
+            stream_cls=Stream[ChatCompletionChunk],
+        )
+
+    def chat_streamed(self,
+                      *,
+                      messages: List[ChatMessage],
+                      on_tool_call: Optional[ToolCallReady] = None,
+                      **kwargs):
+        """Streams the completion and returns it assembled, like `chat`.
+
+        `on_tool_call(index, tool_call)` is called from this thread as soon
+        as a tool call's arguments are complete JSON, so the caller can start
+        the tool while the model is still generating.
+        """
+        with tracer.start_span("jtai.stream", messages=len(messages)) as span:
+            start = time.perf_counter()
+            stream = self.chat(messages=messages, stream=True, **kwargs)
+            if stream is None:
+                span.record_error("completion failed")
+                return None
+
+            from openai import APIError
+
+            accumulator = StreamAccumulator(on_tool_call)
+            try:
+                with stream:
+                    for chunk in stream:
+                        accumulator.feed(chunk)
+            except (APIError, httpx.HTTPError) as e:
+                logger.error("stream interrupted: {}", e)
+                span.record_error(e)
+                self._breaker.record_failure()
+                if kwargs.get("observe", True):
+                    self._limiter.observe("overload")
+                return None
+
+            response = accumulator.completion()
+            if accumulator.first_chunk_at is not None:
+                ttft = accumulator.first_chunk_at - start
+                if kwargs.get("observe", True):
+                    self._limiter.observe("success", ttft)
+                span.set_attribute("ttft_ms", round(ttft * 1000, 1))
+            _record_response(span, response)
             return response
-            # if stream:
-            #     role: Any = None
-            #     for chunk in response:
-            #         LOGGER.debug(f"--- {chunk}")
-            #         if not chunk.choices:
-            #             continue
-            #         delta = chunk.choices[0].delta
-            #         if delta is None:
-            #             continue
-
-            #         role = delta.role if delta.role is not None else role
-            #         content = delta.content if delta.content is not None else ""
-            #         if content is None:
-            #             continue
-
-            #         yield format_chat_message(role, content)
-            # else:
-            #     print(f"--- {response}")
-            #     message = response.choices[0].message
-            #     if message is None:
-            #         raise Exception("Empty response")
-            #     response: ChatMessage = format_chat_message(
-            #         role=(message.role if message.role is not None else "assistant"),
-            #         message=(
-            #             message.content if message.content is not None else ""),
-            #     )
-
-            #     if message.tool_calls is not None and len(message.tool_calls) > 0:
-            #         response["role"] = "function"
-            #         response["content"] = json.dumps(
-            #             [
-            #                 {
-            #                     "id": t.id,
-            #                     "name": t.function.name,
-            #                     "arguments": json.loads(t.function.arguments),
-            #                 }
-            #                 for t in message.tool_calls
-            #             ],
-            #         )
-            #     yield response
-
-        except APIConnectionError as e:
-            print("APIConnectionError: ", e)
-            return None
 
-        except RateLimitError as e:
-            print("RateLimitError: ", e)
-            return None
+    async def achat(self, *, priority: int = 0, **kwargs):
+        """`chat` in a worker thread, once the scheduler limiter has a slot.
+
+        Requests beyond the limiter's window wait on the event loop, highest
+        `priority` first. Returns None, like `chat`, if no slot frees up
+        within the queue timeout.
+        """
+        return await self._admitted(priority, self.chat, **kwargs)
 
-        except APIError as e:
-            print("APIError: ", e)
+    async def achat_streamed(self, *, priority: int = 0, **kwargs):
+        """`chat_streamed` behind the scheduler limiter, like `achat`."""
+        return await self._admitted(priority, self.chat_streamed, **kwargs)
+
+    async def _admitted(self, priority: int, call, **kwargs):
+        if not SCHEDULER_LIMITER:
+            return await asyncio.to_thread(call, **kwargs)
+        try:
+            await self._limiter.acquire(priority)
+        except LimiterTimeout as e:
+            logger.error("scheduler queue timeout: {}", e)
             return None
+        try:
+            return await asyncio.to_thread(call, **kwargs)
+        finally:
+            self._limiter.release()
+
+
+def _record_response(span, response) -> None:
+    if response.usage is not None:
+        span.set_attributes({
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+        })
+    if response.choices:
+        span.set_attribute(
+            "tool_calls", len(response.choices[0].message.tool_calls or []))
 
 
 def format_chat_message_content(
@@ -0,0 +1,202 @@
+import asyncio
+import importlib
+import math
+import multiprocessing
+import os
+import resource
+import signal
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Optional
+
+from app.core import codec
+from app.core.logger import logger
+from app.core.metrics import metrics
+
+TOOL_PROCESS_WORKERS = int(os.getenv("TOOL_PROCESS_WORKERS", 2))
+TOOL_PROCESS_MEMORY_MB = int(os.getenv("TOOL_PROCESS_MEMORY_MB", 1024))
+TOOL_PROCESS_CPU_SECONDS = int(os.getenv("TOOL_PROCESS_CPU_SECONDS", 30))
+
+_restarts = metrics.counter(
+    "tool_process_restarts_total", "Tool worker processes replaced after a timeout or crash")
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+def callback_target(callback: Callable) -> str:
+    """Import path the worker resolves the callback from, so only the
+    name crosses the pipe instead of a pickled function."""
+    return f"{callback.__module__}:{callback.__qualname__}"
+
+
+def _resolve(target: str) -> Callable:
+    module_name, _, qualname = target.partition(":")
+    value = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        value = getattr(value, attr)
+    return value
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded("CPU time limit exceeded")
+
+
+def _cpu_used() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _worker_main(conn: Connection, memory_mb: int) -> None:
+    # The parent handles shutdown; a Ctrl-C must not kill warm workers first.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    memory_limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    conn.send("ready")
+
+    callbacks: Dict[str, Callable] = {}
+    while True:
+        try:
+            target, arguments, cpu_seconds, call_memory_mb = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        # Per-call limits: the soft limits move, the hard ones stay put.
+        resource.setrlimit(resource.RLIMIT_CPU,
+                           (math.ceil(_cpu_used()) + cpu_seconds, cpu_hard))
+        resource.setrlimit(resource.RLIMIT_AS,
+                           (min(call_memory_mb * 1024 * 1024, memory_limit), memory_limit))
+        try:
+            callback = callbacks.get(target)
+            if callback is None:
+                callback = callbacks[target] = _resolve(target)
+            reply = ("ok", str(callback(codec.loads(arguments))))
+        except codec.JSONDecodeError as e:
+            reply = ("error", f"Invalid JSON arguments. {str(e)}")
+        except MemoryError:
+            reply = ("error", "memory limit exceeded")
+        except BaseException as e:
+            reply = ("error", f"{type(e).__name__}: {str(e)}")
+        finally:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard, cpu_hard))
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, context, memory_mb: int):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, memory_mb), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class ProcessToolPool:
+    """Warm worker processes for tools declared with `mode="process"`.
+
+    Workers are spawned on first use and reused across calls. Each call runs
+    under its own CPU-time (`RLIMIT_CPU`) and address-space (`RLIMIT_AS`)
+    soft limits; a call that is cancelled or times out kills its worker,
+    which is replaced without affecting the calls running in the others.
+    """
+
+    def __init__(self, size: int = TOOL_PROCESS_WORKERS, memory_mb: int = TOOL_PROCESS_MEMORY_MB):
+        self.size = size
+        self.memory_mb = memory_mb
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self.memory_mb)
+        # Blocks until the interpreter is up and the limits are in place.
+        worker.conn.recv()
+        return worker
+
+    async def _add_worker(self) -> None:
+        worker = await asyncio.to_thread(self._spawn)
+        if self._idle is None:  # closed while it was starting
+            worker.kill()
+            return
+        self._workers.append(worker)
+        self._idle.put_nowait(worker)
+
+    def _replace(self, worker: _Worker) -> None:
+        if worker not in self._workers:
+            return  # the pool was closed: `close` stops the process
+        self._workers.remove(worker)
+        _restarts.inc()
+        asyncio.ensure_future(self._respawn(worker))
+
+    async def _respawn(self, worker: _Worker) -> None:
+        # kill() joins the process: keep that off the event loop.
+        await asyncio.to_thread(worker.kill)
+        await self._add_worker()
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        self._idle = asyncio.Queue()
+        await asyncio.gather(*(self._add_worker() for _ in range(self.size)))
+        logger.info("Started {} tool worker processes", self.size)
+
+    async def run(
+        self,
+        target: str,
+        arguments: str,
+        cpu_seconds: int = TOOL_PROCESS_CPU_SECONDS,
+        memory_mb: Optional[int] = None,
+    ) -> str:
+        await self.start()
+        worker = await self._idle.get()
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = worker.conn.fileno()
+        try:
+            worker.conn.send((target, arguments, cpu_seconds, memory_mb or self.memory_mb))
+            loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                loop.remove_reader(fd)
+            status, result = worker.conn.recv()
+        except (EOFError, OSError):
+            code = worker.process.exitcode
+            logger.error("tool worker [{}] died running {} (exit {})",
+                         worker.process.pid, target, code)
+            self._replace(worker)
+            return f"Error: tool process exited with {code}"
+        except BaseException:
+            # Cancelled or timed out mid-call: the worker may still be busy.
+            self._replace(worker)
+            raise
+
+        if self._idle is not None:
+            self._idle.put_nowait(worker)
+        return result if status == "ok" else f"Error: {result}"
+
+    async def close(self) -> None:
+        # Detached first, so calls finishing meanwhile neither replace nor
+        # return their workers.
+        workers, self._workers, self._idle = self._workers, [], None
+        for worker in workers:
+            worker.conn.close()
+        for worker in workers:
+            await asyncio.to_thread(worker.process.join, 2)
+            if worker.process.is_alive():
+                worker.process.kill()
+
+
+process_pool = ProcessToolPool()
@@ -0,0 +1,119 @@
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from app.core import codec
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+ToolCallReady = Callable[[int, Dict], None]
+
+
+class _PartialToolCall:
+    __slots__ = ("id", "name", "arguments", "announced")
+
+    def __init__(self):
+        self.id = ""
+        self.name = ""
+        self.arguments = ""
+        self.announced = False
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "type": "function",
+            "function": {"name": self.name, "arguments": self.arguments},
+        }
+
+
+def _is_complete_json(text: str) -> bool:
+    text = text.rstrip()
+    if not text.endswith("}"):
+        return False
+    try:
+        return isinstance(codec.loads(text), dict)
+    except ValueError:
+        return False
+
+
+class StreamAccumulator:
+    """Assembles streamed chunks back into a `ChatCompletion`.
+
+    `on_tool_call(index, tool_call)` fires as soon as a tool call's arguments
+    parse as a complete JSON object, typically well before the stream ends.
+    The final completion stays authoritative: the arguments may still grow
+    (in practice only when the server streams malformed JSON), so callers
+    compare against it before using anything started early.
+    """
+
+    def __init__(self, on_tool_call: Optional[ToolCallReady] = None):
+        self.on_tool_call = on_tool_call
+        self.id = ""
+        self.model = ""
+        self.created = int(time.time())
+        self.content: List[str] = []
+        self.tool_calls: Dict[int, _PartialToolCall] = {}
+        self.finish_reason: Optional[str] = None
+        self.usage = None
+        self.first_chunk_at: Optional[float] = None
+
+    def feed(self, chunk: "ChatCompletionChunk") -> None:
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        self.id = chunk.id or self.id
+        self.model = chunk.model or self.model
+        self.created = chunk.created or self.created
+        if chunk.usage is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return
+
+        choice = chunk.choices[0]
+        if choice.finish_reason is not None:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta
+        if delta is None:
+            return
+        if delta.content:
+            self.content.append(delta.content)
+        for part in delta.tool_calls or []:
+            call = self.tool_calls.setdefault(part.index, _PartialToolCall())
+            if part.id:
+                call.id = part.id
+            if part.function is not None:
+                if part.function.name:
+                    call.name += part.function.name
+                if part.function.arguments:
+                    call.arguments += part.function.arguments
+            self._announce(part.index, call)
+
+    def _announce(self, index: int, call: _PartialToolCall) -> None:
+        if self.on_tool_call is None or call.announced or not call.name:
+            return
+        if _is_complete_json(call.arguments):
+            call.announced = True
+            self.on_tool_call(index, call.to_dict())
+
+    def completion(self) -> "ChatCompletion":
+        from openai.types.chat import ChatCompletion
+
+        tool_calls = [self.tool_calls[index].to_dict()
+                      for index in sorted(self.tool_calls)]
+        message = {
+            "role": "assistant",
+            "content": "".join(self.content) or None,
+        }
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return ChatCompletion.model_validate({
+            "id": self.id or "chatcmpl-stream",
+            "object": "chat.completion",
+            "created": self.created,
+            "model": self.model,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": self.finish_reason or ("tool_calls" if tool_calls else "stop"),
+            }],
+            "usage": self.usage.model_dump() if self.usage is not None else None,
+        })
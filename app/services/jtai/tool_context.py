@@ -1,9 +1,19 @@
-import json
-from typing import Any, Callable, Dict, List, Optional, Union
+import asyncio
+import contextvars
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field, ValidationError
 
-from app.core.logger import logger
+from app.core import codec
+from app.core.cache import get_cache
+from app.core.logger import clip, logger
+from app.core.tracing import tracer
+
+from .process_pool import TOOL_PROCESS_CPU_SECONDS, callback_target, process_pool
+
+ExecutionMode = Literal["inline", "thread", "process"]
 
 
 class FunctionParameter:
@@ -12,12 +22,15 @@ class FunctionParameter:
         type: str = "string",
         description: str = "",
         enum: Optional[List[str]] = None,
-        required: bool = True
+        required: bool = True,
+        items: Optional[Dict[str, Any]] = None,
     ):
         self.type = type
         self.description = description
         self.enum = enum
         self.required = required
+        # JSON schema of the elements, for `type="array"`.
+        self.items = items
 
 
 class Function:
@@ -27,14 +40,68 @@ class Function:
         description: str,
         parameters: Dict[str, FunctionParameter],
         callback: Optional[Callable[[Dict[str, Any]], Any]] = None,
-        async_callback: Optional[Callable[[Dict[str, Any]], Any]] = None
+        async_callback: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        timeout: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        cacheable: bool = False,
+        cache_ttl: float = 300.0,
+        mode: ExecutionMode = "thread",
+        cpu_seconds: int = TOOL_PROCESS_CPU_SECONDS,
+        memory_mb: Optional[int] = None,
+        warmup: Optional[Callable[[], None]] = None,
     ):
+        """`timeout` (seconds) is enforced by `run`; `concurrency` caps
+        simultaneous executions in this process; `cacheable` results are
+        reused for identical arguments for `cache_ttl` seconds.
+
+        `mode` selects where `run` executes the callback: `inline` on the
+        event loop (the async callback, or a sync one that never blocks),
+        `thread` in the default thread pool, or `process` in the warm worker
+        processes, limited to `cpu_seconds` of CPU and `memory_mb` of address
+        space per call. Process callbacks must be importable module-level
+        functions. A tool with only an async callback always runs inline.
+
+        `warmup` is called (in a thread) by `warm` before the service
+        reports ready, to open connections or load whatever the first call
+        would otherwise pay for.
+        """
+        if mode == "process" and callback is None:
+            raise ValueError(f"process tool {name} needs a sync callback")
+        if mode == "thread" and callback is None and async_callback is not None:
+            mode = "inline"
         self.name = name
         self.description = description
         self.parameters = parameters
         self.callback = callback
+        self.async_callback = async_callback
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.cacheable = cacheable
+        self.cache_ttl = cache_ttl
+        self.mode = mode
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.warmup = warmup
+        self._schema: Optional[Dict] = None
+        self._slots = threading.BoundedSemaphore(
+            concurrency) if concurrency else nullcontext()
+        self._async_slots: Optional[asyncio.Semaphore] = None
 
     def to_openai_tool(self) -> Dict:
+        if self._schema is None:
+            self._schema = self._build_schema()
+        return self._schema
+
+    async def warm(self) -> None:
+        self.to_openai_tool()
+        if self.cacheable:
+            get_cache(f"tool:{self.name}", ttl=self.cache_ttl)
+        if self.mode == "process":
+            await process_pool.start()
+        if self.warmup is not None:
+            await asyncio.to_thread(self.warmup)
+
+    def _build_schema(self) -> Dict:
         properties = {}
         required = []
         for param_name, param in self.parameters.items():
@@ -44,6 +111,8 @@ class Function:
             }
             if param.enum:
                 prop["enum"] = param.enum
+            if param.items:
+                prop["items"] = param.items
             properties[param_name] = prop
             if param.required:
                 required.append(param_name)
@@ -62,18 +131,108 @@ class Function:
         }
 
     def _validate_args(self, args: Dict[str, Any]) -> Optional[str]:
-        for param in self.parameters.required:
-            if param not in args:
-                return f"Error: Missing required parameter '{param}'"
-        for param, prop in self.parameters.properties.items():
-            if "enum" in prop and args.get(param) not in prop["enum"]:
-                return f"Error: Invalid value for '{param}'"
+        for param_name, param in self.parameters.items():
+            if param.required and param_name not in args:
+                return f"Error: Missing required parameter '{param_name}'"
+            if param.enum and args.get(param_name) not in param.enum:
+                return f"Error: Invalid value for '{param_name}'"
         return None
 
+    @staticmethod
+    def _cache_key(arguments: str) -> str:
+        try:
+            return codec.dumps(codec.loads(arguments), sort_keys=True)
+        except ValueError:
+            return arguments
+
+    def _cached(self, span, arguments: str):
+        cache = get_cache(f"tool:{self.name}", ttl=self.cache_ttl) if self.cacheable else None
+        if cache is None:
+            return None, None
+        key = self._cache_key(arguments)
+        cached = cache.get(key)
+        span.set_attribute("cache_hit", cached is not None)
+        return cached, lambda result: cache.set(key, result)
+
+    @staticmethod
+    def _finish(span, result: str, store) -> str:
+        if result.startswith("Error:"):
+            span.record_error(result)
+        elif store is not None and result.strip():
+            # An empty result is more often a hiccup than a real answer.
+            store(result)
+        span.set_attribute("result_size", len(result))
+        return result
+
     def execute(self, arguments: str) -> str:
+        """Run the sync callback in the calling thread."""
+        with tracer.start_span("tool.execute", tool=self.name) as span:
+            cached, store = self._cached(span, arguments)
+            if cached is not None:
+                return cached
+
+            with self._slots:
+                result = self._execute(arguments)
+            return self._finish(span, result, store)
+
+    async def run(self, arguments: str) -> str:
+        """Run the tool according to its `mode`, with its timeout."""
+        with tracer.start_span("tool.execute", tool=self.name, mode=self.mode) as span:
+            cached, store = self._cached(span, arguments)
+            if cached is not None:
+                return cached
+
+            if self.concurrency and self._async_slots is None:
+                self._async_slots = asyncio.Semaphore(self.concurrency)
+            try:
+                if self.mode == "thread":
+                    result = await self._run_thread(arguments)
+                else:
+                    async with self._async_slots or nullcontext():
+                        result = await asyncio.wait_for(self._run(arguments), self.timeout)
+            except asyncio.TimeoutError:
+                logger.error("function {} timed out after {}s", self.name, self.timeout)
+                result = f"Error: {self.name} timed out after {self.timeout}s"
+            return self._finish(span, result, store)
+
+    async def _run(self, arguments: str) -> str:
+        if self.mode == "process":
+            logger.debug("function {} args: {}", self.name, clip(arguments))
+            return await process_pool.run(
+                callback_target(self.callback), arguments,
+                cpu_seconds=self.cpu_seconds, memory_mb=self.memory_mb)
+        if self.async_callback is not None:
+            return await self.async_execute(arguments)
+        return self._execute(arguments)
+
+    async def _run_thread(self, arguments: str) -> str:
+        """Runs the callback in the default thread pool. A thread can't be
+        stopped, so its concurrency slot is given back only when it returns,
+        not when the caller times out or goes away."""
+        slots = self._async_slots
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+
+        def work() -> str:
+            try:
+                return context.run(self._execute, arguments)
+            finally:
+                if slots is not None:
+                    try:
+                        loop.call_soon_threadsafe(slots.release)
+                    except RuntimeError:
+                        pass  # loop closed while the thread ran
+
+        if slots is not None:
+            await slots.acquire()
+        # Shielded so `work` always runs, and so always releases the slot.
+        future = loop.run_in_executor(None, work)
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+    def _execute(self, arguments: str) -> str:
         try:
-            args = json.loads(arguments)
-            logger.info(f"- Function - {self.name} args: {args}")
+            args = codec.loads(arguments)
+            logger.debug("function {} args: {}", self.name, clip(args))
             # if error := self._validate_args(args):
             #     return error
             if self.callback is None:
@@ -87,7 +246,7 @@ class Function:
 
             result = self.callback(args)
             return str(result)
-        except json.JSONDecodeError as e:
+        except codec.JSONDecodeError as e:
             logger.error(e)
             return f"Error: Invalid JSON arguments. {str(e)}"
         except Exception as e:
@@ -96,7 +255,7 @@ class Function:
 
     async def async_execute(self, arguments: str) -> str:
         try:
-            args = json.loads(arguments)
+            args = codec.loads(arguments)
             if error := self._validate_args(args):
                 return error
             if self.async_callback is None:
@@ -104,7 +263,7 @@ class Function:
 
             result = await self.async_callback(args)
             return str(result)
-        except json.JSONDecodeError:
+        except codec.JSONDecodeError:
             return "Error: Invalid JSON arguments"
         except Exception as e:
             return f"Error: {str(e)}"
@@ -120,13 +279,17 @@ class FunctionManager:
         self.functions[func.name] = func
 
     def get_tools(self) -> List[Dict]:
-        return [func.to_openai_tool() for func in self.functions.values()]
+        # Sorted so the tool schemas are the same bytes on every request.
+        return [self.functions[name].to_openai_tool() for name in sorted(self.functions)]
+
+    def get(self, name: str) -> Optional[Function]:
+        return self.functions.get(name)
 
-    def execute_tool_call(self, tool_call: Dict) -> str:
+    async def run_tool_call(self, tool_call: Dict) -> str:
         func_name = tool_call["function"]["name"]
         if func_name not in self.functions:
             return f"Error: Function {func_name} not found"
-        return self.functions[func_name].execute(tool_call["function"]["arguments"])
+        return await self.functions[func_name].run(tool_call["function"]["arguments"])
 
 
 class AsyncFunctionManager:
@@ -1,23 +1,13 @@
 import asyncio
-import logging
 import os
 import socket
-from typing import Any, Dict, Optional
-
-import psutil
-import yaml
-from nacos import NacosClient
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 
 from app.core import app_settings
+from app.core.logger import clip, logger
 
-# from app.config import nacos_settings
-# from app.core.logger import logger
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:
+    from nacos import NacosClient
 
 
 class NacosManager:
@@ -33,11 +23,16 @@ class NacosManager:
 
         self.heartbeat_task: Optional[asyncio.Task] = None
         self._registered = False
-        self._service_ip = self.get_local_ip()
+        # Resolved on first use: the manager is created at import time, and
+        # services running with NACOS=false never need the address.
+        self._service_ip: Optional[str] = None
         self._current_config = {}
+        self._listeners: List[Callable[["NacosManager"], None]] = []
 
     def _init_client(self):
         if self._client is None:
+            from nacos import NacosClient
+
             self._client = NacosClient(
                 server_addresses=self.server,
                 namespace=self.namespace,
@@ -51,22 +46,37 @@ class NacosManager:
 
     @property
     def service_ip(self) -> str:
-        return self._service_ip or self.get_local_ip()
+        if self._service_ip is None:
+            self._service_ip = self.get_local_ip()
+        return self._service_ip
 
-    def get_client(self) -> NacosClient:
+    def add_listener(self, listener: Callable[["NacosManager"], None]) -> None:
+        """Call `listener` whenever the registration state or config changes."""
+        self._listeners.append(listener)
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logger.error(f"Nacos listener failed: {str(e)}")
+
+    def get_client(self) -> "NacosClient":
         return self._client
 
     def get_config(self) -> Dict[str, Any]:
         return self._current_config or self.load_initial_config()
 
     def load_initial_config(self) -> Dict[str, Any]:
+        import yaml
+
         try:
             config_str = self._client.get_config(
                 data_id=self.data_id, group=self.group
             )
             self._current_config = yaml.safe_load(config_str)
-            logger.info(
-                f"Successfully loaded config from Nacos: {self._current_config}")
+            logger.info("Successfully loaded config from Nacos: {}",
+                        clip(self._current_config))
             app_settings.merge_config(self._current_config)
 
         except yaml.YAMLError as e:
@@ -81,6 +91,8 @@ class NacosManager:
 
     @staticmethod
     def get_local_ip() -> str:
+        import psutil
+
         try:
             for interface, addrs in psutil.net_if_addrs().items():
                 for addr in addrs:
@@ -101,7 +113,6 @@ class NacosManager:
         self._init_client()
 
         self.load_initial_config()
-        logger.info(f"Config loaded: {self._current_config}")
 
         logger.info(
             f"Registering at {self.service_ip}:{app_settings.app.port}"
@@ -118,6 +129,7 @@ class NacosManager:
             )
             self._registered = True
             self.heartbeat_task = asyncio.create_task(self._send_heartbeat())
+            self._notify()
 
             logger.info(
                 f"Service registered at {self.service_ip}:{app_settings.app.port}"
@@ -154,17 +166,21 @@ class NacosManager:
             )
 
             self._registered = False
+            self._notify()
             logger.info("Service deregistered")
         except Exception as e:
             logger.error(f"Service deregistration failed: {str(e)}")
             raise RuntimeError("Nacos deregistration failed") from e
 
     def _on_nacos_config_changed(self, new_config):
+        import yaml
+
         try:
             raw_content = new_config.get("raw_content")
             config_str = yaml.safe_load(raw_content)
             self._current_config = config_str
             app_settings.merge_config(config_str)
+            self._notify()
         except Exception as e:
             logger.error(f"Config update failed: {str(e)}")
 
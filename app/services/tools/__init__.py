@@ -1,5 +1,6 @@
-from .websearch import websearch_func
+from .registry import ToolRegistry, tool_registry
 
 __ALL_ = [
-    "websearch_func"
-]
\ No newline at end of file
+    "ToolRegistry",
+    "tool_registry",
+]
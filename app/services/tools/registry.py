@@ -0,0 +1,106 @@
+import importlib
+import threading
+from importlib.metadata import entry_points
+from typing import Dict, List, Optional
+
+from app.core.logger import logger
+from app.core.settings import AppSettings, app_settings
+from app.services.jtai import Function
+
+ENTRY_POINT_GROUP = "llm_agent_service.tools"
+
+BUILTIN_TOOLS = {
+    "web_search": "app.services.tools.websearch:websearch_func",
+}
+
+DEFAULT_AGENT_TOOLS = {
+    "websearch": ["web_search"],
+}
+
+
+def _load_target(target: str) -> Function:
+    module_name, _, attr = target.partition(":")
+    value = getattr(importlib.import_module(module_name), attr)
+    # A factory is allowed in place of a ready-made Function.
+    if not isinstance(value, Function) and callable(value):
+        value = value()
+    if not isinstance(value, Function):
+        raise TypeError(f"{target} is not a Function")
+    return value
+
+
+class ToolRegistry:
+    """Names of available tools mapped to where they live, imported on first use.
+
+    Tools come from, in increasing precedence: the built-ins, the
+    `llm_agent_service.tools` entry point group of installed packages, and the
+    `tools.plugins` mapping of `name: "module:attr"` in app settings. Which
+    tools an agent offers comes from `agents.<agent>.tools`.
+    """
+
+    def __init__(self):
+        self._targets: Optional[Dict[str, str]] = None
+        self._loaded: Dict[str, Function] = {}
+        self._lock = threading.RLock()
+
+    def _discover(self) -> Dict[str, str]:
+        targets = dict(BUILTIN_TOOLS)
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            targets[entry_point.name] = entry_point.value
+        plugins = app_settings.get("tools.plugins")
+        if isinstance(plugins, AppSettings):
+            for name, target in plugins._config.items():
+                if isinstance(target, str) and ":" in target:
+                    targets[name] = target
+                else:
+                    logger.warning("ignoring tools.plugins.{}: {!r} is not \"module:attr\"",
+                                   name, target)
+        elif plugins is not None:
+            logger.warning("ignoring tools.plugins: expected a mapping of name to \"module:attr\"")
+        return targets
+
+    def available(self) -> List[str]:
+        with self._lock:
+            if self._targets is None:
+                self._targets = self._discover()
+            return list(self._targets)
+
+    def get(self, name: str) -> Function:
+        func = self._loaded.get(name)
+        if func is not None:
+            return func
+        with self._lock:
+            if name not in self._loaded:
+                if name not in self.available():
+                    raise KeyError(f"unknown tool: {name}")
+                func = _load_target(self._targets[name])
+                if func.name != name:
+                    raise ValueError(f"tool {name} is registered as {func.name}")
+                self._loaded[name] = func
+                logger.info("loaded tool {} from {}", name, self._targets[name])
+            return self._loaded[name]
+
+    def for_agent(self, agent: str) -> List[Function]:
+        names = app_settings.get(f"agents.{agent}.tools")
+        if names is None:
+            names = DEFAULT_AGENT_TOOLS.get(agent, [])
+        functions = []
+        for name in names:
+            try:
+                functions.append(self.get(name))
+            except Exception as e:
+                logger.error("tool {} unavailable for agent {}: {}", name, agent, e)
+        return functions
+
+    def reset(self) -> None:
+        """Rediscover the targets so new config/plugins are picked up. Tools
+        whose target changed are imported again on next use."""
+        with self._lock:
+            targets = self._discover()
+            previous = self._targets or {}
+            self._loaded = {name: func for name, func in self._loaded.items()
+                            if previous.get(name) == targets.get(name)}
+            self._targets = targets
+
+
+tool_registry = ToolRegistry()
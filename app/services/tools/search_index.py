@@ -0,0 +1,203 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from app.core.logger import logger
+from app.core.metrics import metrics
+
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "true").lower() == "true"
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "data/search_index.sqlite3")
+SEARCH_INDEX_FRESH_SECONDS = float(os.getenv("SEARCH_INDEX_FRESH_SECONDS", 3600))
+SEARCH_INDEX_TTL_SECONDS = float(os.getenv("SEARCH_INDEX_TTL_SECONDS", 86400))
+SEARCH_INDEX_MAX_PASSAGES = int(os.getenv("SEARCH_INDEX_MAX_PASSAGES", 50000))
+SEARCH_INDEX_MIN_RESULTS = int(os.getenv("SEARCH_INDEX_MIN_RESULTS", 3))
+SEARCH_INDEX_MIN_COVERAGE = float(os.getenv("SEARCH_INDEX_MIN_COVERAGE", 0.8))
+SEARCH_INDEX_MATCH = os.getenv("SEARCH_INDEX_MATCH", "terms").lower()
+SEARCH_INDEX_RESULTS = int(os.getenv("SEARCH_INDEX_RESULTS", 10))
+
+_lookups_total = metrics.counter(
+    "search_index_lookups_total", "Local search index lookups by outcome", ["outcome"])
+_passages = metrics.gauge(
+    "search_index_passages", "Passages held in the local search index")
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+_CJK_CHAR = re.compile(f"[{_CJK}]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words, and overlapping bigrams for runs of CJK characters
+    (which have no spaces to split on)."""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        run = match.group()
+        if _CJK_CHAR.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class SearchIndex:
+    """Bounded on-disk BM25 index of passages returned by the search backend.
+
+    Passages are stored pre-tokenized in an SQLite FTS5 table, with the
+    keyword they were fetched for. `search` answers from the index only when
+    at least `min_results` passages fetched within `fresh_seconds` match the
+    query; otherwise the caller goes to the backend and `add`s what it got.
+    With `match="terms"` a passage matches when it or its keyword contains
+    `min_coverage` of the query's terms, so passages fetched for a related
+    keyword count; with `match="phrase"` it must contain the whole query as
+    a phrase. Passages older than `ttl_seconds` are evicted, and the oldest
+    beyond `max_passages`.
+    """
+
+    def __init__(
+        self,
+        path: str = SEARCH_INDEX_PATH,
+        fresh_seconds: float = SEARCH_INDEX_FRESH_SECONDS,
+        ttl_seconds: float = SEARCH_INDEX_TTL_SECONDS,
+        max_passages: int = SEARCH_INDEX_MAX_PASSAGES,
+        min_results: int = SEARCH_INDEX_MIN_RESULTS,
+        min_coverage: float = SEARCH_INDEX_MIN_COVERAGE,
+        match: str = SEARCH_INDEX_MATCH,
+    ):
+        if match not in ("terms", "phrase"):
+            raise ValueError(f"unknown search index match mode: {match}")
+        self.path = Path(path)
+        self.fresh_seconds = fresh_seconds
+        self.ttl_seconds = ttl_seconds
+        self.max_passages = max_passages
+        self.min_results = min_results
+        self.min_coverage = min_coverage
+        self.match = match
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._added = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS passages ("
+                "id INTEGER PRIMARY KEY, digest TEXT UNIQUE, keyword TEXT, "
+                "text TEXT, fetched_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS passages_fetched_at ON passages (fetched_at)")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts "
+                "USING fts5(keyword, text)")
+            self._conn = conn
+        return self._conn
+
+    def open(self) -> int:
+        """Opens (or creates) the index file; returns the passage count."""
+        with self._lock:
+            count = self._connect().execute("SELECT count(*) FROM passages").fetchone()[0]
+        _passages.set(count)
+        return count
+
+    def search(self, keyword: str, limit: int = SEARCH_INDEX_RESULTS) -> Optional[List[str]]:
+        """Fresh passages relevant to `keyword`, or None when the index
+        can't answer it well enough."""
+        tokens = tokenize(keyword)
+        if not tokens:
+            return None
+        # Tokens are word characters only, so they need no escaping.
+        if self.match == "phrase":
+            query = '"' + " ".join(tokens) + '"'
+        else:
+            query = " OR ".join(f'"{term}"' for term in sorted(set(tokens)))
+        since = time.time() - self.fresh_seconds
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT p.keyword, p.text FROM passages_fts f JOIN passages p ON p.id = f.rowid "
+                "WHERE passages_fts MATCH ? AND p.fetched_at >= ? "
+                "ORDER BY bm25(passages_fts, 2.0, 1.0) LIMIT ?",
+                (query, since, max(limit, self.min_results) * 4)).fetchall()
+
+        terms = set(tokens)
+        results = []
+        for row_keyword, text in rows:
+            covered = terms & (set(tokenize(row_keyword)) | set(tokenize(text)))
+            if len(covered) / len(terms) >= self.min_coverage:
+                results.append(text)
+                if len(results) >= limit:
+                    break
+
+        if len(results) < min(self.min_results, limit):
+            _lookups_total.inc(outcome="miss" if not rows else "insufficient")
+            return None
+        _lookups_total.inc(outcome="hit")
+        return results
+
+    def add(self, keyword: str, passages: Sequence[str]) -> None:
+        now = time.time()
+        keyword_tokens = " ".join(tokenize(keyword))
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                for text in passages:
+                    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                    row = conn.execute(
+                        "SELECT id FROM passages WHERE digest = ?", (digest,)).fetchone()
+                    if row is not None:
+                        # Seen again: it is fresh as of now.
+                        conn.execute("UPDATE passages SET fetched_at = ? WHERE id = ?",
+                                     (now, row[0]))
+                        continue
+                    cursor = conn.execute(
+                        "INSERT INTO passages (digest, keyword, text, fetched_at) "
+                        "VALUES (?, ?, ?, ?)", (digest, keyword, text, now))
+                    conn.execute(
+                        "INSERT INTO passages_fts (rowid, keyword, text) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, keyword_tokens, " ".join(tokenize(text))))
+                    self._added += 1
+                    _passages.inc()
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+            if self._added >= 100:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        self._added = 0
+        cutoff = time.time() - self.ttl_seconds
+        conn.execute("BEGIN")
+        try:
+            stale = [row[0] for row in conn.execute(
+                "SELECT id FROM passages WHERE fetched_at < ? OR id IN ("
+                "SELECT id FROM passages ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (cutoff, self.max_passages))]
+            conn.executemany("DELETE FROM passages WHERE id = ?", [(i,) for i in stale])
+            conn.executemany("DELETE FROM passages_fts WHERE rowid = ?", [(i,) for i in stale])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        count = conn.execute("SELECT count(*) FROM passages").fetchone()[0]
+        _passages.set(count)
+        if stale:
+            logger.info("本地搜索索引清理 {} 条，剩余 {} 条", len(stale), count)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+search_index: Optional[SearchIndex] = SearchIndex() if SEARCH_INDEX else None
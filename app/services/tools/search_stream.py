@@ -0,0 +1,99 @@
+import time
+from typing import Dict, List, Optional
+
+from pydantic import ValidationError
+
+from app.core import codec
+from app.core.logger import clip, logger
+from app.services.jtai.tool_context import FunctionParts
+
+
+class SearchStreamParser:
+    """Incremental parser for the VMP search `delta` events.
+
+    Only `browser_result` parts carry passages, so every other event is
+    dropped on a substring check of the raw payload or on the `status` /
+    `response.type` discriminators, before any pydantic validation. Passages
+    are collected as they arrive (deduplicated by text), so a stream that is
+    cut short by `max_results` or the time `budget` still yields what it had.
+    """
+
+    def __init__(self, max_results: int = 0, budget: float = 0):
+        self.max_results = max_results
+        self.deadline = time.monotonic() + budget if budget > 0 else None
+        self.results: List[str] = []
+        self._seen = set()
+        self.finished = False
+        self.stopped: Optional[str] = None
+        self.events = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.usage: Optional[Dict[str, int]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished or self.stopped is not None
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def feed(self, raw: str) -> bool:
+        """Consume one `delta` event payload; returns True once done."""
+        self.events += 1
+        if "browser_result" not in raw:
+            self.skipped += 1
+            return self._check_budget()
+
+        try:
+            data = codec.loads(raw)
+        except codec.JSONDecodeError:
+            self.invalid += 1
+            logger.warning("搜索事件不是JSON: {}", clip(raw, 200))
+            return self._check_budget()
+
+        response = data.get("response") if isinstance(data, dict) else None
+        if not isinstance(response, dict) or response.get("type") != "browser_result":
+            self.skipped += 1
+            return self._check_budget()
+
+        try:
+            part = FunctionParts.model_validate(response)
+        except ValidationError as e:
+            self.invalid += 1
+            logger.warning("搜索结果格式错误: {}", clip(e.errors(), 500))
+            return self._check_budget()
+
+        self._add(part)
+        if isinstance(data.get("Usage"), dict):
+            self.usage = data["Usage"]
+        if data.get("status") == "finish" and part.status == "finish":
+            self.finished = True
+        return self.done or self._check_budget()
+
+    def _add(self, part: FunctionParts) -> None:
+        for item in part.result or []:
+            if item.text is None or item.text in self._seen:
+                continue
+            self._seen.add(item.text)
+            self.results.append(item.text)
+            if self.max_results and len(self.results) >= self.max_results:
+                self.stopped = "max_results"
+                return
+
+    def _check_budget(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.stopped = "budget"
+        return self.done
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "events": self.events,
+            "skipped": self.skipped,
+            "invalid": self.invalid,
+            "results": len(self.results),
+            "finished": self.finished,
+            "stopped": self.stopped,
+            "usage": self.usage,
+        }
@@ -1,24 +1,163 @@
-import json
+import contextvars
 import os
-from typing import Dict, List, Optional, Union
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
 import httpx
 from httpx_sse import SSEError, connect_sse
-from pydantic import BaseModel, Field, ValidationError
 
 # from app.config import VMP_SEARCH_URL
-from app.core.logger import logger
-from app.services.jtai import Function, FunctionParameter, FunctionResponse
+from app.core.circuit import get_breaker
+from app.core.logger import clip, logger
+from app.core.tracing import propagation_headers, tracer
+from app.services.jtai import Function, FunctionParameter
+
+from .search_index import SEARCH_INDEX_RESULTS, search_index
+from .search_stream import SearchStreamParser
 
 VMP_SEARCH_URL = os.getenv(
     "VMP_SEARCH_URL", "http://172.31.192.111:30443/largemodel/search/dataLake/api/v2/kb/search/stream")
 
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 0))
+SEARCH_BUDGET_SECONDS = float(os.getenv("SEARCH_BUDGET_SECONDS", 0))
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", 90))
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", 16))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", 300))
+SEARCH_WARMUP_CONNECTIONS = int(os.getenv("SEARCH_WARMUP_CONNECTIONS", 4))
+SEARCH_MAX_KEYWORDS = int(os.getenv("SEARCH_MAX_KEYWORDS", 5))
+SEARCH_MERGED_MAX_CHARS = int(os.getenv("SEARCH_MERGED_MAX_CHARS", 12000))
+
+SEARCH_UNAVAILABLE = "Error: search backend unavailable"
+
+breaker = get_breaker("search")
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+    """Connection pool shared by every search call in this process. Each
+    call may fan out to `SEARCH_MAX_KEYWORDS` requests."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(limits=httpx.Limits(
+                    max_connections=max(SEARCH_CONCURRENCY, 1) * max(SEARCH_MAX_KEYWORDS, 2),
+                    max_keepalive_connections=max(SEARCH_CONCURRENCY, 1)))
+    return _client
+
+
+def close_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+    if search_index is not None:
+        search_index.close()
+
+
+def warm_search(connections: int = SEARCH_WARMUP_CONNECTIONS) -> None:
+    """Opens the local index and keep-alive connections to the search backend."""
+    if search_index is not None:
+        logger.info("本地搜索索引已加载 {} 条", search_index.open())
+    client = get_client()
+
+    def connect(_) -> None:
+        try:
+            client.head(VMP_SEARCH_URL, timeout=3.0)
+        except httpx.HTTPError as e:
+            logger.warning("搜索预热连接失败: {}", e)
+
+    if connections > 0:
+        with ThreadPoolExecutor(connections) as executor:
+            list(executor.map(connect, range(connections)))
+
 
 def websearch_callback(args: Dict) -> str:
-    logger.info(f"websearch_callback args: {args}")
-    keyword = args["keyword"]
+    logger.debug("websearch_callback args: {}", clip(args))
+    keywords = _keywords(args)
+    if not keywords:
+        return "Error: Missing required parameter 'keyword'"
+    if len(keywords) == 1:
+        results = _search(keywords[0])
+        return SEARCH_UNAVAILABLE if results is None else '\n\n'.join(results)
+
+    # Each keyword runs in its own thread on the shared client, in this
+    # call's context so the spans stay in the same trace.
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(len(keywords)) as executor:
+        ranked = list(executor.map(
+            lambda keyword: context.copy().run(_search, keyword), keywords))
+    if all(results is None for results in ranked):
+        return SEARCH_UNAVAILABLE
+    merged = merge_results([results or [] for results in ranked], SEARCH_MERGED_MAX_CHARS)
+    logger.info("多关键字搜索 {} 个关键字，合并后 {} 条", len(keywords), len(merged))
+    return '\n\n'.join(merged)
+
+
+def _keywords(args: Dict[str, Any]) -> List[str]:
+    """`keyword` and `keywords` together, deduplicated, at most
+    `SEARCH_MAX_KEYWORDS`."""
+    candidates = [args.get("keyword")]
+    extra = args.get("keywords")
+    candidates.extend(extra if isinstance(extra, list) else [extra])
+    keywords: List[str] = []
+    seen = set()
+    for keyword in candidates:
+        if not isinstance(keyword, str) or not keyword.strip():
+            continue
+        keyword = keyword.strip()
+        if keyword.lower() not in seen:
+            seen.add(keyword.lower())
+            keywords.append(keyword)
+    return keywords[:max(SEARCH_MAX_KEYWORDS, 1)]
+
+
+def merge_results(ranked: List[List[str]], max_chars: int = 0) -> List[str]:
+    """Merges per-keyword result lists by reciprocal rank fusion.
 
-    headers = {}
+    A passage scores 1 / (60 + rank) for each list it appears in, so
+    passages found by several keywords rise to the top. Duplicates are
+    dropped (compared ignoring whitespace), and passages are taken in score
+    order while they fit in `max_chars` (0 for no limit).
+    """
+    scores: Dict[str, float] = {}
+    texts: Dict[str, str] = {}
+    for results in ranked:
+        for rank, text in enumerate(results):
+            key = " ".join(text.split())
+            scores[key] = scores.get(key, 0.0) + 1.0 / (60 + rank)
+            texts.setdefault(key, text)
+
+    merged: List[str] = []
+    size = 0
+    # Stable: ties keep the order in which the passages were first seen.
+    for key in sorted(scores, key=lambda key: -scores[key]):
+        text = texts[key]
+        if max_chars and merged and size + len(text) > max_chars:
+            continue
+        if max_chars and not merged:
+            text = text[:max_chars]
+        merged.append(text)
+        size += len(text) + 2
+    return merged
+
+
+def _search(keyword: str) -> Optional[List[str]]:
+    """Passages for one keyword: from the local index when it can answer,
+    else from the backend. None when the backend is unavailable."""
+    local = _search_local(keyword)
+    if local is not None:
+        return local
+
+    if not breaker.allow():
+        logger.warning("search circuit open, skipping search")
+        return None
+
+    headers = propagation_headers()
 
     body = {
         "query_sentence": keyword,
@@ -27,67 +166,118 @@ def websearch_callback(args: Dict) -> str:
         "summarize": True
     }
 
+    parser = SearchStreamParser(
+        max_results=SEARCH_MAX_RESULTS, budget=SEARCH_BUDGET_SECONDS)
+
+    # A read can't outlast the budget; whatever arrived by then is returned.
+    budget = parser.remaining()
     timeout = httpx.Timeout(
         connect=3.0,
-        read=60.0,
+        read=60.0 if budget is None else min(60.0, budget),
         write=3.0,
         pool=3.0,
     )
 
-    results = []
-
-    try:
-        with httpx.Client(timeout=timeout) as client:
-            with connect_sse(client, method="POST", url=VMP_SEARCH_URL, headers=headers, json=body) as event_source:
+    with tracer.start_span("http.vmp_search", url=VMP_SEARCH_URL) as span:
+        try:
+            with connect_sse(get_client(), method="POST", url=VMP_SEARCH_URL, headers=headers,
+                             json=body, timeout=timeout) as event_source:
+                span.set_attribute(
+                    "status_code", event_source.response.status_code)
                 event_source.response.raise_for_status()
 
                 for event in event_source.iter_sse():
-                    try:
-                        if event.event == "delta":
-                            data = event.json()
-                            search_response = FunctionResponse.model_validate(
-                                data)
-                            if search_response.status == "finish":
-                                response = search_response.response
-                                if response.type == "browser_result" and response.status == "finish":
-                                    results = [
-                                        item.text for item in response.result if item.text is not None]
-
-                            # print(data)
-                    except json.JSONDecodeError:
-                        print("Not JSON:")
-                        continue
-                    except ValidationError as e:
-                        print(e.errors())
-                        continue
-
-    except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP 错误: {e.response.status_code}")
-    except httpx.RequestError as e:
-        logger.error(f"请求失败: {e}")
-    except httpx.ConnectTimeout as e:
-        logger.error(
-            f"连接超时：{e.request.url} 无法在 {e.request.timeout.connect} 秒内建立连接")
-    except httpx.ReadTimeout as e:
-        logger.error(
-            f"读取超时：{e.request.url} 在 {e.request.timeout.read} 秒内未收到数据")
-    except SSEError as e:
-        logger.error(f"返回格式错误：{e.request.url} 返回的不是SSE")
-
-    return '\n\n'.join(results)
+                    if event.event == "delta" and parser.feed(event.data):
+                        break
+
+        except httpx.HTTPStatusError as e:
+            span.record_error(e)
+            logger.error("HTTP 错误: {}", e.response.status_code)
+        except httpx.ConnectTimeout as e:
+            span.record_error(e)
+            logger.error(
+                "连接超时：{} 无法在 {} 秒内建立连接", e.request.url, timeout.connect)
+        except httpx.ReadTimeout as e:
+            if parser.results:
+                parser.stopped = "read_timeout"
+                logger.warning(
+                    "读取超时，返回已收到的 {} 条结果", len(parser.results))
+            else:
+                span.record_error(e)
+                logger.error(
+                    "读取超时：{} 在 {} 秒内未收到数据", e.request.url, timeout.read)
+        except httpx.RequestError as e:
+            span.record_error(e)
+            logger.error("请求失败: {}", e)
+        except SSEError as e:
+            span.record_error(e)
+            logger.error("返回格式错误：{} 返回的不是SSE", VMP_SEARCH_URL)
+
+        span.set_attributes(parser.stats())
+        failed = span.status == "error"
+        if failed and span.attributes.get("status_code", 500) >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    if parser.results:
+        _index(keyword, parser.results)
+    elif failed:
+        # Not "no results": the caller reports the backend as unavailable,
+        # and nothing gets cached.
+        return None
+    return parser.results
+
+
+def _search_local(keyword: str) -> Optional[List[str]]:
+    if search_index is None:
+        return None
+    with tracer.start_span("search_index.search") as span:
+        try:
+            results = search_index.search(
+                keyword, limit=SEARCH_MAX_RESULTS or SEARCH_INDEX_RESULTS)
+        except sqlite3.Error as e:
+            span.record_error(e)
+            logger.warning("本地搜索索引查询失败: {}", e)
+            return None
+        span.set_attribute("hit", results is not None)
+        if results is not None:
+            span.set_attribute("results", len(results))
+            logger.info("本地搜索索引命中 {} 条: {}", len(results), clip(keyword, 50))
+        return results
+
+
+def _index(keyword: str, results: List[str]) -> None:
+    if search_index is None:
+        return
+    try:
+        search_index.add(keyword, results)
+    except sqlite3.Error as e:
+        logger.warning("本地搜索索引写入失败: {}", e)
 
 
 websearch_params = {
     "keyword": FunctionParameter(
         type="string",
         description="查询关键字",
-        required=True
-    )
+        required=False
+    ),
+    "keywords": FunctionParameter(
+        type="array",
+        description="多个查询关键字，问题包含多个方面时一次给出，会并发查询并合并结果",
+        required=False,
+        items={"type": "string"},
+    ),
 }
 
 websearch_func = Function(
     name="web_search",
-    description="联网查询",
+    description="联网查询，可以用 keywords 一次查询多个关键字",
     parameters=websearch_params,
-    callback=websearch_callback
+    callback=websearch_callback,
+    timeout=SEARCH_TIMEOUT_SECONDS,
+    concurrency=SEARCH_CONCURRENCY,
+    cacheable=SEARCH_CACHE_TTL > 0,
+    cache_ttl=SEARCH_CACHE_TTL,
+    warmup=warm_search,
 )
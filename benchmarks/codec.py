@@ -0,0 +1,124 @@
+"""Micro-benchmark of the JSON hot paths: stdlib json against `app.core.codec`.
+
+    python -m benchmarks.codec --iterations 20000
+
+The codec uses orjson when it is installed (`JSON_CODEC=stdlib` forces the
+fallback, which should then match the stdlib column). The request-body row
+compares against httpx's own `json=` encoding, which the scheduler client
+replaces with the codec.
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+import httpx
+from starlette.responses import JSONResponse
+
+from app.core import codec
+
+PASSAGE = "搜索结果 search result passage " * 40
+
+
+def search_event(results: int) -> str:
+    return json.dumps({
+        "role": "assistant",
+        "status": "finish",
+        "response": {
+            "type": "browser_result",
+            "status": "finish",
+            "text": "",
+            "result": [{"id": i, "text": f"{i} {PASSAGE}"} for i in range(results)],
+        },
+        "Usage": {"prompt_tokens": 120, "completion_tokens": 30},
+    }, ensure_ascii=False)
+
+
+def request_body(rounds: int) -> Dict:
+    messages = [{"role": "system", "content": "You are a search assistant."},
+                {"role": "user", "content": "今天的新闻"}]
+    for i in range(rounds):
+        call_id = f"call_{i}"
+        messages.append({"role": "assistant", "content": None, "tool_calls": [{
+            "id": call_id, "type": "function",
+            "function": {"name": "web_search", "arguments": json.dumps({"keyword": f"新闻 {i}"})}}]})
+        messages.append({"role": "tool", "tool_call_id": call_id,
+                         "content": "\n\n".join(PASSAGE for _ in range(10))})
+    return {
+        "model": "jiutian-lan-comv3",
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": 1024,
+        "user": "user",
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        "tools": [{"type": "function", "function": {
+            "name": "web_search", "description": "联网查询",
+            "parameters": {"type": "object", "required": ["keyword"], "properties": {
+                "keyword": {"type": "string", "description": "查询关键字"}}}}}],
+        "tool_choice": "auto",
+        "recordId": "0" * 32,
+        "sourceType": "playground",
+        "auditSwitch": False,
+    }
+
+
+def httpx_encode(body: Dict) -> bytes:
+    return httpx.Request("POST", "http://scheduler", json=body).content
+
+
+def per_call_us(fn: Callable[[], object], iterations: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    arguments = json.dumps({"keyword": "今天的新闻 headline"}, ensure_ascii=False)
+    event = search_event(10)
+    body = request_body(3)
+    job = {"id": "0" * 32, "status": "done", "result": "\n\n".join(PASSAGE for _ in range(5)),
+           "created_at": 1.0, "attempts": 1}
+
+    cases = [
+        ("tool arguments (loads)", arguments,
+         lambda: json.loads(arguments), lambda: codec.loads(arguments)),
+        ("tool cache key (loads+dumps)", arguments,
+         lambda: json.dumps(json.loads(arguments), sort_keys=True, ensure_ascii=False),
+         lambda: codec.dumps(codec.loads(arguments), sort_keys=True)),
+        ("search event (loads)", event,
+         lambda: json.loads(event), lambda: codec.loads(event)),
+        ("request body (encode)", codec.dumpb(body),
+         lambda: httpx_encode(body), lambda: codec.dumpb(body)),
+        ("response (render)", codec.dumpb(job),
+         lambda: JSONResponse(job), lambda: codec.JSONResponse(job)),
+    ]
+
+    rows: List[Dict] = []
+    for name, payload, baseline, candidate in cases:
+        iterations = max(100, args.iterations * 2000 // max(len(payload), 2000))
+        before = per_call_us(baseline, iterations)
+        after = per_call_us(candidate, iterations)
+        rows.append({"case": name, "bytes": len(payload),
+                     "stdlib_us": round(before, 2), "codec_us": round(after, 2),
+                     "speedup": round(before / after, 2)})
+
+    if args.json:
+        print(json.dumps({"codec": codec.codec_name, "results": rows}, indent=2))
+        return
+    print(f"codec: {codec.codec_name}")
+    print(f"{'case':<30} {'bytes':>8} {'stdlib us':>10} {'codec us':>10} {'speedup':>8}")
+    for row in rows:
+        print(f"{row['case']:<30} {row['bytes']:>8} {row['stdlib_us']:>10} "
+              f"{row['codec_us']:>10} {row['speedup']:>7}x")
+
+
+if __name__ == "__main__":
+    main()
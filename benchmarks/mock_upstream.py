@@ -0,0 +1,230 @@
+"""Local stand-ins for the LLM scheduler and the VMP search backend.
+
+Both servers run uvicorn in a background thread on an ephemeral port, so the
+service under test talks to them over real HTTP exactly as in production.
+"""
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class SchedulerOptions:
+    latency: float = 0.2
+    """Seconds before the first byte of every completion."""
+
+    chunk_delay: float = 0.01
+    """Seconds between chunks when streaming."""
+
+    tail_delay: float = 0.0
+    """Seconds of generation after a streamed tool call's arguments are done."""
+
+    tool_call_rate: float = 1.0
+    """Probability that a first round answers with a web_search tool call."""
+
+    error_rate: float = 0.0
+    """Probability of answering with `error_status` instead of a completion."""
+
+    error_status: int = 500
+
+
+@dataclass
+class SearchOptions:
+    latency: float = 0.3
+    """Seconds before the first SSE event."""
+
+    event_delay: float = 0.01
+    """Seconds between SSE events."""
+
+    events: int = 20
+    """Number of intermediate `delta` events before the browser_result."""
+
+    results: int = 5
+    """Number of passages in the final browser_result."""
+
+    passage_size: int = 400
+
+    error_rate: float = 0.0
+
+
+def _completion(model: str, message: dict, finish_reason: str) -> dict:
+    return {
+        "id": f"chatcmpl-{random.getrandbits(48):x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": finish_reason,
+        }],
+        "usage": {
+            "prompt_tokens": 100,
+            "completion_tokens": 20,
+            "total_tokens": 120,
+        },
+    }
+
+
+def _chunk(model: str, delta: dict, finish_reason: Optional[str] = None) -> str:
+    data = {
+        "id": "chatcmpl-stream",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_scheduler_app(options: SchedulerOptions) -> FastAPI:
+    """OpenAI-compatible `/chat/completions` that can stream and emit tool calls."""
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(options.latency)
+
+        if random.random() < options.error_rate:
+            return JSONResponse({"error": {"message": "injected failure"}},
+                                status_code=options.error_status)
+
+        model = body.get("model", "mock")
+        messages = body.get("messages", [])
+        has_tool_result = any(m.get("role") == "tool" for m in messages)
+        query = next((m.get("content") for m in reversed(messages)
+                      if m.get("role") == "user"), "") or ""
+        if isinstance(query, list):
+            # Multimodal: text parts only.
+            query = " ".join(part.get("text", "") for part in query
+                             if part.get("type") == "text")
+
+        if body.get("tools") and not has_tool_result and random.random() < options.tool_call_rate:
+            arguments = json.dumps({"keyword": query}, ensure_ascii=False)
+            tool_call = {
+                "id": f"call_{random.getrandbits(32):x}",
+                "type": "function",
+                "function": {"name": "web_search", "arguments": arguments},
+            }
+            message = {"role": "assistant", "content": None,
+                       "tool_calls": [tool_call]}
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant",
+                       "content": f"mock answer for: {query}"}
+            finish_reason = "stop"
+
+        if not body.get("stream"):
+            return JSONResponse(_completion(model, message, finish_reason))
+
+        async def stream():
+            yield _chunk(model, {"role": "assistant", "content": ""})
+            if message.get("tool_calls"):
+                call = message["tool_calls"][0]
+                arguments = call["function"]["arguments"]
+                yield _chunk(model, {"tool_calls": [{
+                    "index": 0, "id": call["id"], "type": "function",
+                    "function": {"name": "web_search", "arguments": ""}}]})
+                for i in range(0, len(arguments), 8):
+                    await asyncio.sleep(options.chunk_delay)
+                    yield _chunk(model, {"tool_calls": [{
+                        "index": 0, "function": {"arguments": arguments[i:i + 8]}}]})
+                await asyncio.sleep(options.tail_delay)
+            else:
+                for word in message["content"].split(" "):
+                    await asyncio.sleep(options.chunk_delay)
+                    yield _chunk(model, {"content": word + " "})
+            yield _chunk(model, {}, finish_reason)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def _search_event(status: str, part_type: str, part_status: str, result=None) -> str:
+    data = {
+        "role": "assistant",
+        "status": status,
+        "response": {
+            "type": part_type,
+            "status": part_status,
+            "text": "",
+            "result": result,
+        },
+    }
+    return f"event: delta\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_search_app(options: SearchOptions) -> FastAPI:
+    """VMP-style SSE search stream ending in a `browser_result` event."""
+    app = FastAPI()
+
+    @app.post("/{path:path}")
+    async def search(path: str, request: Request):
+        body = await request.json()
+        await asyncio.sleep(options.latency)
+
+        if random.random() < options.error_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+
+        keyword = body.get("query_sentence", "")
+
+        async def stream():
+            for i in range(options.events):
+                await asyncio.sleep(options.event_delay)
+                yield _search_event("running", "text", "init")
+            passages = [
+                {"id": i, "text": f"[{keyword}] passage {i} " +
+                 "x" * options.passage_size}
+                for i in range(options.results)
+            ]
+            yield _search_event("finish", "browser_result", "finish", passages)
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+class MockServer:
+    """Runs an ASGI app with uvicorn in a daemon thread on 127.0.0.1."""
+
+    def __init__(self, app: FastAPI, port: int = 0):
+        self.port = port or _free_port()
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port,
+            log_level="warning", access_log=False))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "MockServer":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("mock server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
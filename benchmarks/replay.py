@@ -0,0 +1,294 @@
+"""Replay captured agent runs against the app, with upstreams served from the capture.
+
+    AGENT_CAPTURE=true python -m app.server            # record real traffic
+    python -m benchmarks.replay data/captures/websearch.jsonl.gz
+    python -m benchmarks.replay <capture> --scale 0 --concurrency 20
+
+The scheduler and the search backend are replaced by local servers that
+answer each request with the recorded response after the recorded duration
+times `--scale`. Runs start at their recorded offsets (also scaled), or back
+to back on `--concurrency` workers. Nothing reaches live services. Other
+tools run for real.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .mock_upstream import MockServer, _chunk, _search_event
+from .run import (SCHEMA_VERSION, LoopLagSampler, _git_commit, _peak_rss_mb,
+                  _rss_mb, compare, isolate_state, summarize)
+
+ChatKey = Tuple[str, int]
+
+
+def index_recordings(recordings: List[Dict]) -> Tuple[Dict[ChatKey, Dict], Dict[str, Dict]]:
+    """Recorded completions by (query, tool results so far), and web_search
+    results by keyword. The last recording wins on duplicates."""
+    from app.services.agents.websearch import normalize_query
+
+    chats: Dict[ChatKey, Dict] = {}
+    searches: Dict[str, Dict] = {}
+    for recording in recordings:
+        query = normalize_query(recording["query"])
+        for call in recording["calls"]:
+            if call["kind"] == "chat" and call["response"] is not None:
+                chats[(query, call["request"]["tool_results"])] = call
+            elif call["kind"] == "tool" and call["name"] == "web_search":
+                try:
+                    arguments = json.loads(call["arguments"])
+                except ValueError:
+                    continue
+                if not isinstance(arguments, dict):
+                    continue
+                # A multi-keyword call recorded only its merged result: serve
+                # that for each keyword, and the merge deduplicates it again.
+                keywords = [arguments.get("keyword")] + list(arguments.get("keywords") or [])
+                for keyword in keywords:
+                    if isinstance(keyword, str):
+                        searches[keyword.strip()] = call
+    return chats, searches
+
+
+def _stream_chunks(completion: Dict, include_usage: bool):
+    model = completion.get("model", "replay")
+    choice = completion["choices"][0]
+    message = choice["message"]
+    yield _chunk(model, {"role": "assistant", "content": ""})
+    for index, call in enumerate(message.get("tool_calls") or []):
+        yield _chunk(model, {"tool_calls": [{
+            "index": index, "id": call["id"], "type": "function",
+            "function": {"name": call["function"]["name"],
+                         "arguments": call["function"]["arguments"]}}]})
+    if message.get("content"):
+        yield _chunk(model, {"content": message["content"]})
+    yield _chunk(model, {}, choice.get("finish_reason") or "stop")
+    if include_usage and completion.get("usage"):
+        usage = json.dumps({"id": "chatcmpl-replay", "object": "chat.completion.chunk",
+                            "created": int(time.time()), "model": model, "choices": [],
+                            "usage": completion["usage"]})
+        yield f"data: {usage}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def create_replay_scheduler_app(chats: Dict[ChatKey, Dict], scale: float,
+                                misses: Dict[str, int]) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        # Imported here: the app must not load before its env is set.
+        from app.services.agents.capture import count_tool_results
+        from app.services.agents.websearch import normalize_query
+
+        body = await request.json()
+        messages = body.get("messages", [])
+        query = next((m.get("content") for m in messages if m.get("role") == "user"), "") or ""
+        if isinstance(query, list):
+            query = " ".join(part.get("text", "") for part in query if part.get("type") == "text")
+        call = chats.get((normalize_query(query), count_tool_results(messages)))
+        if call is None:
+            misses["scheduler"] = misses.get("scheduler", 0) + 1
+            return JSONResponse({"error": {"message": "not in capture"}}, status_code=404)
+
+        await asyncio.sleep(call["duration"] * scale)
+        completion = call["response"]
+        if not body.get("stream"):
+            return JSONResponse(completion)
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(_stream_chunks(completion, include_usage),
+                                 media_type="text/event-stream")
+
+    return app
+
+
+def create_replay_search_app(searches: Dict[str, Dict], scale: float,
+                             misses: Dict[str, int]) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/{path:path}")
+    async def search(path: str, request: Request):
+        body = await request.json()
+        call = searches.get(body.get("query_sentence", ""))
+        if call is None:
+            misses["search"] = misses.get("search", 0) + 1
+            passages, duration = [], 0.0
+        else:
+            # web_search joins passages with blank lines.
+            passages = [{"id": i, "text": text}
+                        for i, text in enumerate((call["result"] or "").split("\n\n"))]
+            duration = call["duration"]
+
+        async def stream():
+            await asyncio.sleep(duration * scale)
+            yield _search_event("finish", "browser_result", "finish", passages)
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+async def replay(app, recordings: List[Dict], *, scale: float, concurrency: int,
+                 timeout: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    mismatched = 0
+    sampler = LoopLagSampler()
+    first = min(recording["started_at"] for recording in recordings)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay",
+                                     timeout=timeout) as client:
+            async def send(recording: Dict) -> None:
+                nonlocal mismatched
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/agent/websearch",
+                                                 params={"query": recording["query"]})
+                    status = str(response.status_code)
+                    if response.status_code == 200 and response.json() != recording["answer"]:
+                        mismatched += 1
+                except Exception as e:
+                    status = type(e).__name__
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+            async def at_offset(recording: Dict, started: float) -> None:
+                delay = (recording["started_at"] - first) * scale
+                await asyncio.sleep(max(0.0, started + delay - time.perf_counter()))
+                await send(recording)
+
+            pending = list(recordings)
+
+            async def worker() -> None:
+                while pending:
+                    await send(pending.pop(0))
+
+            rss_before = _rss_mb()
+            sampler.start()
+            started = time.perf_counter()
+            if concurrency > 0:
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+            else:
+                await asyncio.gather(*(at_offset(r, started) for r in recordings))
+            elapsed = time.perf_counter() - started
+            await sampler.stop()
+
+    errors = sum(count for status, count in statuses.items() if status != "200")
+    return {
+        "requests": len(recordings),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(recordings) / elapsed, 3) if elapsed else 0.0,
+        "errors": errors,
+        "mismatched_answers": mismatched,
+        "statuses": statuses,
+        "latency_ms": summarize(latencies),
+        "loop_lag_ms": summarize(sampler.samples),
+        "memory_mb": {
+            "rss_before": round(rss_before, 1),
+            "rss_after": round(_rss_mb(), 1),
+            "peak_rss": round(_peak_rss_mb(), 1),
+        },
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("capture", type=str, help="capture file (.jsonl or .jsonl.gz)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplier for recorded durations and offsets; 0 for none")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="run back to back on this many workers instead of at offsets")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N runs")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--label", type=str, default="replay")
+    parser.add_argument("--output", type=str, default="benchmarks/results")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="previous result file to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+
+    # Filled in below; the servers only need their ports to exist now.
+    chats: Dict[ChatKey, Dict] = {}
+    searches: Dict[str, Dict] = {}
+    misses: Dict[str, int] = {}
+    scheduler = MockServer(create_replay_scheduler_app(chats, args.scale, misses))
+    search = MockServer(create_replay_search_app(searches, args.scale, misses))
+
+    # The service reads its upstream addresses at import time. Each replay
+    # starts from empty local databases and does not capture itself.
+    os.environ["NACOS"] = "false"
+    os.environ["SCHEDULER_BASE_URL"] = scheduler.url
+    os.environ["VMP_SEARCH_URL"] = f"{search.url}/search/stream"
+    os.environ["AGENT_CAPTURE"] = "false"
+    isolate_state("replay-")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from app.main import app
+    from app.services.agents.capture import read_recordings
+
+    recordings = [r for r in read_recordings(args.capture) if r.get("agent") == "websearch"]
+    recordings.sort(key=lambda r: r["started_at"])
+    if args.limit:
+        recordings = recordings[:args.limit]
+    if not recordings:
+        raise SystemExit(f"no websearch recordings in {args.capture}")
+    recorded_chats, recorded_searches = index_recordings(recordings)
+    chats.update(recorded_chats)
+    searches.update(recorded_searches)
+    scheduler.start()
+    search.start()
+
+    try:
+        results = asyncio.run(replay(app, recordings, scale=args.scale,
+                                     concurrency=args.concurrency, timeout=args.timeout))
+    finally:
+        scheduler.stop()
+        search.stop()
+    results["upstream_misses"] = misses
+
+    commit = _git_commit()
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "label": args.label,
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "capture": args.capture,
+            "recordings": len(recordings),
+            "scale": args.scale,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    name = f"{stamp}-{commit}{'-' + args.label if args.label else ''}.json"
+    (output / name).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(json.dumps(results, indent=2))
+    print(f"saved to {output / name}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(compare(report, baseline))
+    return report
+
+
+if __name__ == "__main__":
+    main()
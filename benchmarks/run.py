@@ -0,0 +1,296 @@
+"""Drive `/agent/websearch` in-process against the local mock upstreams.
+
+    python -m benchmarks.run --requests 200 --concurrency 20
+    python -m benchmarks.run --compare benchmarks/results/<previous>.json
+
+Every run writes a JSON result file so numbers can be compared across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .mock_upstream import (MockServer, SchedulerOptions, SearchOptions,
+                            create_scheduler_app, create_search_app)
+
+SCHEMA_VERSION = 1
+
+COMPARED_METRICS = [
+    ("throughput_rps", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("loop_lag_ms.p99", False),
+    ("loop_lag_ms.max", False),
+    ("memory_mb.peak_rss", False),
+    ("errors", False),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values, default=0.0), 3),
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+    }
+
+
+class LoopLagSampler:
+    """Measures how late a periodic sleep wakes up on the running loop."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+        self._since = 0.0
+
+    def _lag(self) -> float:
+        loop = asyncio.get_running_loop()
+        return max(0.0, loop.time() - self._since - self.interval) * 1000
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._since = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(self._lag())
+
+    def start(self) -> None:
+        self._since = asyncio.get_running_loop().time()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # A loop that never yielded still owes the pending wake-up.
+        self.samples.append(self._lag())
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True,
+            stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def drive(app, *, requests: int, concurrency: int, queries: List[str],
+                timeout: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    sampler = LoopLagSampler()
+    next_index = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     timeout=timeout) as client:
+            async def worker():
+                nonlocal next_index
+                while next_index < requests:
+                    index = next_index
+                    next_index += 1
+                    query = queries[index % len(queries)]
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post("/agent/websearch",
+                                                     params={"query": query})
+                        status = str(response.status_code)
+                    except Exception as e:
+                        status = type(e).__name__
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+            rss_before = _rss_mb()
+            sampler.start()
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            await sampler.stop()
+
+    errors = sum(count for status, count in statuses.items()
+                 if status != "200")
+    return {
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3) if elapsed else 0.0,
+        "errors": errors,
+        "statuses": statuses,
+        "latency_ms": summarize(latencies),
+        "loop_lag_ms": summarize(sampler.samples),
+        "memory_mb": {
+            "rss_before": round(rss_before, 1),
+            "rss_after": round(_rss_mb(), 1),
+            "peak_rss": round(_peak_rss_mb(), 1),
+        },
+    }
+
+
+def _lookup(results: Dict[str, Any], dotted: str) -> Optional[float]:
+    value: Any = results
+    for key in dotted.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> str:
+    lines = [f"{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}"]
+    for metric, higher_is_better in COMPARED_METRICS:
+        old = _lookup(baseline["results"], metric)
+        new = _lookup(current["results"], metric)
+        if old is None or new is None:
+            continue
+        change = ((new - old) / old * 100) if old else 0.0
+        worse = change < 0 if higher_is_better else change > 0
+        marker = " !" if worse and abs(change) >= 5 else ""
+        lines.append(
+            f"{metric:<22}{old:>12}{new:>12}{change:>+9.1f}%{marker}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--queries", type=str, default=None,
+                        help="file with one query per line")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--scheduler-latency", type=float, default=0.2)
+    parser.add_argument("--scheduler-error-rate", type=float, default=0.0)
+    parser.add_argument("--tool-call-rate", type=float, default=1.0)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--search-events", type=int, default=20)
+    parser.add_argument("--search-error-rate", type=float, default=0.0)
+    parser.add_argument("--label", type=str, default="")
+    parser.add_argument("--output", type=str, default="benchmarks/results")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="previous result file to compare against")
+    return parser.parse_args(argv)
+
+
+def isolate_state(prefix: str) -> str:
+    """Points the service's local databases at a fresh temp dir, so a run
+    never reads what an earlier one left behind."""
+    state_dir = tempfile.mkdtemp(prefix=prefix)
+    os.environ["SEARCH_INDEX_PATH"] = os.path.join(state_dir, "search_index.sqlite3")
+    os.environ["USAGE_DB_PATH"] = os.path.join(state_dir, "usage.sqlite3")
+    os.environ["JOB_QUEUE_PATH"] = os.path.join(state_dir, "jobs.sqlite3")
+    return state_dir
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+
+    scheduler_options = SchedulerOptions(
+        latency=args.scheduler_latency,
+        tool_call_rate=args.tool_call_rate,
+        error_rate=args.scheduler_error_rate,
+    )
+    search_options = SearchOptions(
+        latency=args.search_latency,
+        events=args.search_events,
+        error_rate=args.search_error_rate,
+    )
+    scheduler = MockServer(create_scheduler_app(scheduler_options)).start()
+    search = MockServer(create_search_app(search_options)).start()
+
+    # The service reads its upstream addresses and data paths at import time.
+    os.environ["NACOS"] = "false"
+    os.environ["SCHEDULER_BASE_URL"] = scheduler.url
+    os.environ["VMP_SEARCH_URL"] = f"{search.url}/search/stream"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    isolate_state("benchmark-")
+
+    from app.main import app
+
+    if args.queries:
+        queries = [line.strip() for line in Path(args.queries).read_text(
+            encoding="utf-8").splitlines() if line.strip()]
+    else:
+        queries = [f"benchmark query {i}" for i in range(50)]
+
+    try:
+        results = asyncio.run(drive(
+            app,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            queries=queries,
+            timeout=args.timeout,
+        ))
+    finally:
+        scheduler.stop()
+        search.stop()
+
+    commit = _git_commit()
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "label": args.label,
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "queries": len(queries),
+            "scheduler": asdict(scheduler_options),
+            "search": asdict(search_options),
+        },
+        "results": results,
+    }
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    name = f"{stamp}-{commit}{'-' + args.label if args.label else ''}.json"
+    (output / name).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(json.dumps(results, indent=2))
+    print(f"saved to {output / name}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(compare(report, baseline))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# Set before the app is imported: modules read their settings at import time.
+_data_dir = tempfile.mkdtemp(prefix="llm-agent-tests-")
+os.environ.setdefault("NACOS", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("SEARCH_INDEX_PATH", os.path.join(_data_dir, "search_index.sqlite3"))
+os.environ.setdefault("USAGE_DB_PATH", os.path.join(_data_dir, "usage.sqlite3"))
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(_data_dir, "jobs.sqlite3"))
+os.environ.setdefault("BATCH_CHECKPOINT_DIR", os.path.join(_data_dir, "checkpoints"))
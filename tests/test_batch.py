@@ -0,0 +1,97 @@
+import asyncio
+
+from app.services.agents import batch
+from app.services.agents.batch import BatchCheckpoint, BatchRunner, ToolCallMemo, parse_items
+
+
+def _call(keyword: str) -> dict:
+    return {"id": "call", "type": "function",
+            "function": {"name": "web_search", "arguments": f'{{"keyword": "{keyword}"}}'}}
+
+
+def test_memo_reruns_call_when_leader_is_cancelled(monkeypatch):
+    runs = []
+
+    async def execute_tool(manager, tool_call):
+        runs.append(tool_call)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    monkeypatch.setattr(batch, "execute_tool", execute_tool)
+
+    async def main():
+        memo = ToolCallMemo()
+        leader = asyncio.ensure_future(memo(None, _call("a")))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(memo(None, _call("a")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    result, leader_cancelled = asyncio.run(main())
+    assert result == "result"
+    assert leader_cancelled
+    assert len(runs) == 2
+
+
+def test_memo_shares_one_run(monkeypatch):
+    runs = []
+
+    async def execute_tool(manager, tool_call):
+        runs.append(tool_call)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    monkeypatch.setattr(batch, "execute_tool", execute_tool)
+
+    async def main():
+        memo = ToolCallMemo()
+        return await asyncio.gather(*(memo(None, _call("a")) for _ in range(3))), memo.hits
+
+    results, hits = asyncio.run(main())
+    assert results == ["result"] * 3
+    assert hits == 2
+    assert len(runs) == 1
+
+
+class _Agent:
+    def __init__(self, cancel=()):
+        self.cancel = set(cancel)
+        self.queries = []
+
+    async def run(self, query, caller=None, tool_executor=None):
+        self.queries.append(query)
+        if query in self.cancel:
+            raise asyncio.CancelledError()
+        return f"answer: {query}"
+
+
+async def _collect(runner, items):
+    return [result async for result in runner.run(items)]
+
+
+def test_cancelled_group_is_reported_as_error():
+    runner = BatchRunner(_Agent(cancel={"b"}), concurrency=2)
+    results = asyncio.run(asyncio.wait_for(
+        _collect(runner, parse_items(["a", "b", "B "])), timeout=5))
+
+    by_query = {r["query"]: r for r in results if "query" in r}
+    assert by_query["a"]["status"] == "ok"
+    assert by_query["b"]["status"] == "error"
+    assert by_query["B "]["status"] == "error"
+    assert results[-1]["summary"]["error"] == 2
+
+
+def test_checkpoint_resumes_only_matching_queries(tmp_path):
+    checkpoint = BatchCheckpoint(tmp_path / "batch.jsonl")
+    first = _Agent()
+    asyncio.run(_collect(BatchRunner(first, checkpoint=checkpoint), parse_items(["a", "b"])))
+
+    second = _Agent()
+    results = asyncio.run(_collect(BatchRunner(second, checkpoint=checkpoint),
+                                   parse_items(["a", "c"])))
+
+    by_query = {r["query"]: r for r in results if "query" in r}
+    assert by_query["a"].get("resumed") is True
+    assert by_query["c"]["answer"] == "answer: c"
+    assert second.queries == ["c"]
@@ -0,0 +1,64 @@
+import base64
+import io
+
+import pytest
+
+from app.core.cache import LocalCache
+from app.services.jtai import images
+from app.services.jtai.images import ImagePipeline
+
+
+def _png(size) -> bytes:
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _data_url(data: bytes, mime: str = "image/png") -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = ImagePipeline(max_side=64)
+    pipeline._cache_store = LocalCache(maxsize=16)
+    yield pipeline
+    pipeline.close()
+
+
+def test_large_image_is_resized(pipeline):
+    prepared = pipeline.prepare(_data_url(_png((300, 200))))
+
+    assert prepared.startswith("data:image/jpeg;base64,")
+    from PIL import Image
+    with Image.open(io.BytesIO(base64.b64decode(prepared.partition(",")[2]))) as image:
+        assert max(image.size) == 64
+
+
+def test_without_pillow_images_are_still_deduplicated(pipeline, monkeypatch):
+    monkeypatch.setattr(images, "_has_pillow", False)
+    data = _png((300, 200))
+    loads = []
+    load = pipeline._load
+    monkeypatch.setattr(pipeline, "_load", lambda url: loads.append(url) or load(url))
+
+    first = pipeline.prepare(_data_url(data))
+    # The same bytes under another URL: fetched, then found by content hash.
+    second = pipeline.prepare(_data_url(data, "image/x-png"))
+    again = pipeline.prepare(first)
+
+    assert first == second == again == _data_url(data)
+    assert len(loads) == 2
+
+
+def test_unrecognised_bytes_pass_through(pipeline, monkeypatch):
+    monkeypatch.setattr(images, "_has_pillow", False)
+    url = _data_url(b"not an image")
+
+    assert pipeline.prepare(url) == url
+
+
+def test_internal_hosts_are_refused(pipeline):
+    with pytest.raises(images.ImageError):
+        pipeline._load("http://127.0.0.1/image.png")
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from app.core.jobs import JobQueue, QueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), max_pending=3, lease=60, max_attempts=2)
+
+
+def test_claims_by_priority_then_age(queue):
+    low = queue.submit("search", {"n": 1})
+    high = queue.submit("search", {"n": 2}, priority=5)
+    queue.submit("other", {"n": 3}, priority=9)
+
+    assert queue.claim(["search"])["id"] == high["id"]
+    assert queue.claim(["search"])["id"] == low["id"]
+    assert queue.claim(["search"]) is None
+
+
+def test_full_queue_rejects_submits(queue):
+    for i in range(3):
+        queue.submit("search", {"n": i})
+
+    with pytest.raises(QueueFull):
+        queue.submit("search", {"n": 3})
+
+
+def test_expired_lease_is_retried_until_exhausted(queue):
+    queue.lease = 0
+    job = queue.submit("search", {})
+
+    assert queue.claim(["search"])["attempts"] == 1
+    time.sleep(0.01)
+    assert queue.claim(["search"])["attempts"] == 2
+    time.sleep(0.01)
+    # Out of attempts: not claimed again, failed by housekeeping instead.
+    assert queue.claim(["search"]) is None
+    assert queue.fail_exhausted() == 1
+    assert queue.get(job["id"])["status"] == "failed"
+
+
+def test_renewed_lease_is_not_reclaimed(queue):
+    queue.lease = 0.05
+    job = queue.submit("search", {})
+    queue.claim(["search"])
+
+    time.sleep(0.03)
+    assert queue.renew(job["id"])
+    time.sleep(0.03)
+    assert queue.claim(["search"]) is None
+
+
+def test_release_does_not_count_the_attempt(queue):
+    job = queue.submit("search", {})
+    queue.claim(["search"])
+    queue.release(job["id"])
+
+    assert queue.claim(["search"])["attempts"] == 1
+
+
+def test_finished_job_keeps_its_result(queue):
+    job = queue.submit("search", {"keyword": "今天"})
+    queue.claim(["search"])
+    queue.finish(job["id"], "done", result={"answer": "新闻"})
+
+    finished = queue.get(job["id"])
+    assert finished["status"] == "done"
+    assert finished["payload"] == {"keyword": "今天"}
+    assert finished["result"] == {"answer": "新闻"}
+    assert not queue.renew(job["id"])
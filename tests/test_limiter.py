@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.core.limiter import AdaptiveLimiter, LimiterTimeout
+
+
+def test_growth_wakes_queued_waiters():
+    limiter = AdaptiveLimiter("test-growth", initial=1, max_limit=4)
+
+    async def main():
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        # A success with the window in use: the limit grows to 2.
+        limiter.observe("success")
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(main())
+    assert limiter.limit == 2
+    assert limiter.inflight == 2
+    assert limiter.queued == 0
+
+
+def test_overload_shrinks_the_window():
+    limiter = AdaptiveLimiter("test-overload", initial=10, backoff=0.5)
+
+    limiter.observe("overload")
+    assert limiter.limit == 5
+    # Within one observed latency of the last decrease, a failure belongs
+    # to the same overloaded moment.
+    limiter.observe("success", latency=10.0)
+    limiter.observe("overload")
+    assert limiter.limit == 5
+
+
+def test_slow_response_shrinks_the_window():
+    limiter = AdaptiveLimiter("test-slow", initial=10, backoff=0.5, tolerance=2.0)
+
+    limiter.observe("success", latency=0.1)
+    limiter.observe("success", latency=1.0)
+
+    assert limiter.limit == 5
+
+
+def test_idle_window_does_not_grow():
+    limiter = AdaptiveLimiter("test-idle", initial=4)
+
+    for _ in range(10):
+        limiter.observe("success")
+
+    assert limiter.limit == 4
+
+
+def test_higher_priority_waiters_go_first():
+    limiter = AdaptiveLimiter("test-priority", initial=1)
+    order = []
+
+    async def wait(name, priority):
+        await limiter.acquire(priority)
+        order.append(name)
+        limiter.release()
+
+    async def main():
+        await limiter.acquire()
+        waiters = [asyncio.ensure_future(wait(name, priority))
+                   for name, priority in (("low", 0), ("high", 5), ("low2", 0))]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+    assert order == ["high", "low", "low2"]
+
+
+def test_queue_timeout():
+    limiter = AdaptiveLimiter("test-timeout", initial=1, queue_timeout=0.01)
+
+    async def main():
+        await limiter.acquire()
+        with pytest.raises(LimiterTimeout):
+            await limiter.acquire()
+
+    asyncio.run(main())
+    assert limiter.queued == 0
+    assert limiter.inflight == 1
@@ -0,0 +1,31 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.core import profiler
+from app.core.profiler import ProfilingService
+
+
+def test_non_finite_seconds_are_clamped(monkeypatch):
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(profiler.asyncio, "sleep", sleep)
+    service = ProfilingService()
+
+    asyncio.run(service.profile_cpu(float("nan")))
+    asyncio.run(service.profile_cpu(float("inf")))
+
+    assert slept == [0.1, profiler.MAX_PROFILE_SECONDS]
+
+
+def test_debug_routes_are_off_by_default():
+    from app.main import app
+
+    # Without the context manager the lifespan does not run.
+    client = TestClient(app)
+
+    assert client.get("/debug/limiters").status_code == 404
+    assert client.post("/debug/profile/cpu", params={"seconds": 0.1}).status_code == 404
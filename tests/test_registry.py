@@ -0,0 +1,43 @@
+from app.core.settings import AppSettings
+from app.services.tools import registry
+from app.services.tools.registry import ToolRegistry
+
+
+def _settings(plugins) -> AppSettings:
+    return AppSettings(data={"tools": {"plugins": plugins}})
+
+
+def test_reset_picks_up_new_plugins(monkeypatch):
+    monkeypatch.setattr(registry, "app_settings", _settings({}))
+    tools = ToolRegistry()
+    web_search = tools.get("web_search")
+    assert tools.available() == ["web_search"]
+
+    monkeypatch.setattr(registry, "app_settings", _settings({"extra": "plugin.module:tool"}))
+    assert "extra" not in tools.available()
+    tools.reset()
+
+    assert tools.available() == ["web_search", "extra"]
+    # Unchanged targets keep their loaded tool.
+    assert tools.get("web_search") is web_search
+
+
+def test_reset_reloads_a_changed_target(monkeypatch):
+    monkeypatch.setattr(registry, "app_settings", _settings({}))
+    tools = ToolRegistry()
+    tools.get("web_search")
+
+    monkeypatch.setattr(registry, "app_settings",
+                        _settings({"web_search": "plugin.module:web_search"}))
+    tools.reset()
+
+    assert "web_search" not in tools._loaded
+
+
+def test_malformed_plugins_are_ignored(monkeypatch):
+    monkeypatch.setattr(registry, "app_settings", _settings(
+        {"bad": 3, "also_bad": "no_colon", "good": "plugin.module:tool"}))
+    assert ToolRegistry().available() == ["web_search", "good"]
+
+    monkeypatch.setattr(registry, "app_settings", _settings(["plugin.module:tool"]))
+    assert ToolRegistry().available() == ["web_search"]
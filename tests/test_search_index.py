@@ -0,0 +1,76 @@
+import pytest
+
+from app.services.tools.search_index import SearchIndex, tokenize
+
+PASSAGES = [
+    "Heavy rain is expected in Beijing this weekend.",
+    "The Beijing weather bureau issued a rain warning.",
+    "Rain in Beijing will ease by Monday.",
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "index.sqlite3"), fresh_seconds=60,
+                        ttl_seconds=3600, max_passages=100, min_results=2)
+    yield index
+    index.close()
+
+
+def _age(index, seconds):
+    index._connect().execute("UPDATE passages SET fetched_at = fetched_at - ?", (seconds,))
+
+
+def test_tokenize_splits_cjk_into_bigrams():
+    assert tokenize("北京天气 Rain") == ["北京", "京天", "天气", "rain"]
+
+
+def test_answers_a_related_keyword(index):
+    index.add("beijing rain", PASSAGES)
+
+    assert sorted(index.search("rain beijing")) == sorted(PASSAGES)
+    # Too few terms covered: the backend answers instead.
+    assert index.search("beijing traffic jam") is None
+
+
+def test_phrase_mode_needs_the_whole_phrase(tmp_path):
+    index = SearchIndex(str(tmp_path / "index.sqlite3"), min_results=1, match="phrase")
+    index.add("beijing rain", PASSAGES)
+
+    assert index.search("rain warning") == [PASSAGES[1]]
+    assert index.search("warning rain") is None
+
+
+def test_stale_passages_are_not_served(index):
+    index.add("beijing rain", PASSAGES)
+    _age(index, 120)
+
+    assert index.search("beijing rain") is None
+    # Fetched again: fresh as of now.
+    index.add("beijing rain", PASSAGES)
+    assert index.search("beijing rain") is not None
+
+
+def test_eviction_drops_expired_and_oldest_passages(index):
+    index.max_passages = 2
+    index.add("old", ["expired passage"])
+    _age(index, 7200)
+    index.add("beijing rain", PASSAGES)
+    index._evict(index._connect())
+
+    texts = [row[0] for row in index._connect().execute(
+        "SELECT text FROM passages ORDER BY id")]
+    assert len(texts) == 2
+    assert "expired passage" not in texts
+    fts = index._connect().execute("SELECT count(*) FROM passages_fts").fetchone()[0]
+    assert fts == 2
+
+
+def test_eviction_runs_after_many_adds(index):
+    index.max_passages = 50
+    for i in range(120):
+        index.add(f"keyword {i}", [f"passage number {i}"])
+
+    count = index._connect().execute("SELECT count(*) FROM passages").fetchone()[0]
+    # Evicted down to 50 at the 100th new passage, then 20 more added.
+    assert count == 70
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    group = SingleFlight("test-share")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(group.do("key", work) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["result"] * 3
+    assert len(runs) == 1
+
+
+def test_work_survives_until_the_last_waiter_leaves():
+    group = SingleFlight("test-cancel")
+    started = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        first = asyncio.ensure_future(group.do("key", work))
+        second = asyncio.ensure_future(group.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+
+        # With a single waiter, leaving cancels the work.
+        third = asyncio.ensure_future(group.do("other", work))
+        await asyncio.sleep(0.01)
+        task, _ = group._inflight["other"]
+        third.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await third
+        await asyncio.sleep(0)
+        return result, task.cancelled()
+
+    result, cancelled = asyncio.run(main())
+    assert result == "result"
+    assert cancelled
+    assert len(started) == 2
+
+
+def test_failures_and_none_are_not_reused():
+    group = SingleFlight("test-reuse", reuse_window=60)
+    results = iter([None, ValueError("boom"), "result", "unused"])
+
+    async def work():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def main():
+        assert await group.do("key", work) is None
+        with pytest.raises(ValueError):
+            await group.do("key", work)
+        assert await group.do("key", work) == "result"
+        # Reused within the window.
+        return await group.do("key", work)
+
+    assert asyncio.run(main()) == "result"
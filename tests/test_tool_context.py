@@ -0,0 +1,45 @@
+import asyncio
+
+from app.services.jtai.process_pool import ProcessToolPool
+from app.services.jtai.tool_context import Function, FunctionParameter
+
+
+def _parameters():
+    return {"keyword": FunctionParameter(type="string", description="keyword", required=True)}
+
+
+def test_async_only_tool_runs_inline():
+    async def callback(args):
+        return f"async {args['keyword']}"
+
+    function = Function("lookup", "lookup", _parameters(), async_callback=callback)
+
+    assert function.mode == "inline"
+    assert asyncio.run(function.run('{"keyword": "a"}')) == "async a"
+
+
+def test_sync_tool_runs_in_a_thread():
+    function = Function("lookup", "lookup", _parameters(),
+                        callback=lambda args: f"sync {args['keyword']}", concurrency=1)
+
+    async def main():
+        return await asyncio.gather(*(function.run(f'{{"keyword": "{i}"}}') for i in range(3)))
+
+    assert function.mode == "thread"
+    assert asyncio.run(main()) == ["sync 0", "sync 1", "sync 2"]
+
+
+def test_replace_after_close_is_ignored():
+    class Worker:
+        pass
+
+    pool = ProcessToolPool(size=0)
+    worker = Worker()
+
+    async def main():
+        await pool.start()
+        await pool.close()
+        pool._replace(worker)
+
+    asyncio.run(main())
+    assert pool._workers == []
@@ -0,0 +1,66 @@
+import json
+
+from app.services.tools.search_stream import SearchStreamParser
+from app.services.tools.websearch import _keywords, merge_results
+
+
+def test_merge_ranks_passages_found_by_several_keywords_first():
+    merged = merge_results([
+        ["a", "shared", "b"],
+        ["c", "d", "shared"],
+    ])
+
+    # shared: 1/61 + 1/62; then rank 0 (a, c), rank 1 (d), rank 2 (b).
+    assert merged == ["shared", "a", "c", "d", "b"]
+
+
+def test_merge_drops_whitespace_duplicates():
+    merged = merge_results([["one  passage", "two"], ["one passage\n", "three"]])
+
+    assert merged == ["one  passage", "two", "three"]
+
+
+def test_merge_keeps_within_max_chars():
+    merged = merge_results([["x" * 50, "y" * 30, "z" * 10]], max_chars=70)
+
+    assert merged == ["x" * 50, "z" * 10]
+    # The best passage is cut rather than dropped.
+    assert merge_results([["x" * 50]], max_chars=20) == ["x" * 20]
+
+
+def test_keywords_are_deduplicated():
+    assert _keywords({"keyword": " 新闻 ", "keywords": ["News", "新闻", "news", "", None]}) == [
+        "新闻", "News"]
+    assert _keywords({"keywords": "天气"}) == ["天气"]
+    assert _keywords({}) == []
+
+
+def _event(texts, status="finish"):
+    return json.dumps({
+        "status": status,
+        "response": {"type": "browser_result", "status": status,
+                     "result": [{"id": i, "text": text} for i, text in enumerate(texts)]},
+        "Usage": {"prompt_tokens": 1},
+    }, ensure_ascii=False)
+
+
+def test_stream_parser_collects_passages_until_finish():
+    parser = SearchStreamParser()
+
+    assert not parser.feed('{"response": {"type": "text", "text": "thinking"}}')
+    assert not parser.feed("not json browser_result")
+    assert not parser.feed(_event(["a", "b"], status="init"))
+    assert parser.feed(_event(["b", "c"]))
+
+    assert parser.results == ["a", "b", "c"]
+    assert parser.stats()["skipped"] == 1
+    assert parser.stats()["invalid"] == 1
+    assert parser.usage == {"prompt_tokens": 1}
+
+
+def test_stream_parser_stops_at_max_results():
+    parser = SearchStreamParser(max_results=2)
+
+    assert parser.feed(_event(["a", "b", "c"], status="init"))
+    assert parser.results == ["a", "b"]
+    assert parser.stopped == "max_results"